@@ -18,6 +18,7 @@
 #include "include/basic_simulator.h"
 #include <stdio.h>
 #include <sstream>
+#include <memory>
 #include <cmath>
 #include <stdlib.h>
 
@@ -564,82 +565,17 @@ vector<double> BasicSimulator::simulate(const igraph_t *g, vector<int>& componen
     // string cc = circ.toJSON();
     // cout << cc << endl;
     
-    state_manager mgr;
-    mgr.execute_inplace(circ);
-    vector<double> ps = mgr.getProbabilities();
-    state = mgr.getStateVector();
-
-    return ps;
-}
-
-/*
- * The program may just need to get the result of some qubits. Some ancillary qubits may be ignored.
- */
-inline string convert_to_binary(size_t i, size_t n, const set<int>& mqubits)
-{
-    std::ostringstream oss;
-    for (size_t j=n; j>=1; j--) {
-        size_t pos = n - j;
-        if (mqubits.empty() || mqubits.find(pos) != mqubits.end()) {
-            oss << ((i>>(j-1)) & 1);
-        }
+    vector<double> ps;
+    {
+        // the circuit holds no Python objects, let other Python threads run during the simulation.
+        // The component threads of the parallel mode do not hold the GIL.
+        unique_ptr<py::gil_scoped_release> release;
+        if (PyGILState_Check()) release.reset(new py::gil_scoped_release());
+        state_manager mgr;
+        mgr.execute_inplace(circ);
+        ps = mgr.getProbabilities();
+        state = mgr.getStateVector();
     }
-    return oss.str();
-}
 
-map<string, double> BasicSimulator::pack_probabilities(const vector<double>& probabilities, const set<int>& mqubits)
-{
-    map<string, double> prob_map;
-    size_t sz = probabilities.size();
-    size_t n = (size_t)(log(sz)/log(2));
-    
-    double sum = 0.0;
-    for (size_t i = 0; i < sz; i++) {
-        double p = probabilities[i];
-        if(fabs(p-0.0) > epsilon) {
-            string key = convert_to_binary(i, n, mqubits);
-            if (prob_map.find(key) != prob_map.end())
-                prob_map[key] += p;
-            else
-                prob_map[key] = p;
-            sum += p;
-        }
-    }
-    if(fabs(1.0-sum) > epsilon) {
-        auto rit = prob_map.rbegin();
-        rit->second += (1.0 - sum);
-    }
-    
-    return prob_map;
+    return ps;
 }
-
-map<string, int> BasicSimulator::calc_counts(const map<string, double>& probabilities, int shots)
-{
-    map<string, int> counts;
-    // vector<string> more;
-    vector<string> less;
-
-    int sum = 0;
-    for (auto it = probabilities.begin(); it != probabilities.end(); ++it) {
-        double p = it->second;
-        double val = p * shots;
-        int cnt = (int)val;
-        double rval = round(val);
-        if (cnt > 0) {
-            counts[it->first] = cnt;
-            sum += cnt;
-        }
-        if(rval > val) less.push_back(it->first); 
-    }
-    if (shots > sum) {
-        int total = shots - sum;
-        for (size_t i = 0; i < less.size(); i++)
-        {
-            counts[less[i]] += 1;
-            total--;
-            if(total==0) break;
-        }
-    }
-    
-    return counts;
-}
\ No newline at end of file
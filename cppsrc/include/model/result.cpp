@@ -15,9 +15,11 @@
  */
 
 #include "result.h"
+#include "util/constants.h"
+#include <sstream>
 int Result::repeat = 1024;
 
-Result::Result(/* args */)
+Result::Result(/* args */) : shots(1024)
 {
 }
 
@@ -34,8 +36,103 @@ string Result::to_string(long key, size_t qnum)
     return oss.str();
 }
 
+/*
+ * Keep the probabilities as a vector indexed by basis state. The string keyed maps are only built on request.
+ * The program may just need the result of some qubits, so the vector is marginalized to the measured qubits.
+ */
+void Result::set_probability_vector(vector<double> && ps, const set<int> & mqubits, int shot_num)
+{
+    shots = shot_num;
+    probabilities.clear();
+    counts.clear();
+    size_t sz = ps.size();
+    size_t n = (size_t)(log(sz)/log(2));
+    if (mqubits.empty() || mqubits.size() >= n) {
+        probability_vector = std::move(ps);
+        return;
+    }
+
+    vector<size_t> positions;
+    for (auto pos : mqubits) {
+        if (pos >= 0 && (size_t)pos < n) positions.push_back((size_t)pos);
+    }
+    size_t m = positions.size();
+    probability_vector.assign((size_t)1 << m, 0.0);
+    for (size_t i = 0; i < sz; i++) {
+        size_t key = 0;
+        for (size_t k = 0; k < m; k++) {
+            key = (key << 1) | ((i >> (n - 1 - positions[k])) & 1);
+        }
+        probability_vector[key] += ps[i];
+    }
+}
+
+void Result::pack_probabilities()
+{
+    size_t sz = probability_vector.size();
+    size_t n = (size_t)(log(sz)/log(2));
+
+    double sum = 0.0;
+    for (size_t i = 0; i < sz; i++) {
+        double p = probability_vector[i];
+        if(fabs(p-0.0) > constants::epsilon) {
+            probabilities[to_string(i, n)] = p;
+            sum += p;
+        }
+    }
+    if(!probabilities.empty() && fabs(1.0-sum) > constants::epsilon) {
+        auto rit = probabilities.rbegin();
+        rit->second += (1.0 - sum);
+    }
+}
+
+void Result::calc_counts()
+{
+    vector<string> less;
+
+    int sum = 0;
+    for (auto it = probabilities.begin(); it != probabilities.end(); ++it) {
+        double p = it->second;
+        double val = p * shots;
+        int cnt = (int)val;
+        double rval = round(val);
+        if (cnt > 0) {
+            counts[it->first] = cnt;
+            sum += cnt;
+        }
+        if(rval > val) less.push_back(it->first); 
+    }
+    if (shots > sum) {
+        int total = shots - sum;
+        for (size_t i = 0; i < less.size(); i++)
+        {
+            counts[less[i]] += 1;
+            total--;
+            if(total==0) break;
+        }
+    }
+}
+
+const map<string, double> & Result::get_probabilities()
+{
+    if (probabilities.empty() && !probability_vector.empty()) {
+        pack_probabilities();
+    }
+    return probabilities;
+}
+
+const map<string, int> & Result::get_counts()
+{
+    if (counts.empty() && !probability_vector.empty()) {
+        get_probabilities();
+        calc_counts();
+    }
+    return counts;
+}
+
 string Result::get_random_reading()
 {
+    get_probabilities();
     // vector<string> readings;
     // if (counts.size() != 0) {
     //     for (auto it = counts.begin(); it != counts.end(); ++it) {
@@ -17,6 +17,7 @@
 #ifndef MODEL_RESULT_H
 #define MODEL_RESULT_H
 #include <map>
+#include <set>
 #include <vector>
 #include <string>
 #include <complex>
@@ -30,12 +31,20 @@ public:
     map<string, double> probabilities;
     map<string, int> counts;
     vector<complex<double>> states;
+    // probabilities of the measured qubits indexed by basis state
+    vector<double> probability_vector;
+    int shots;
 public:
     Result();
     ~Result();
+    void set_probability_vector(vector<double> && ps, const set<int> & mqubits, int shot_num);
+    const map<string, double> & get_probabilities();
+    const map<string, int> & get_counts();
     string get_random_reading();
 private:
     static int repeat;
     string to_string(long key, size_t qnum);
+    void pack_probabilities();
+    void calc_counts();
 };
 #endif
\ No newline at end of file
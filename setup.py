@@ -104,6 +104,7 @@ setup(
     ],
     ext_modules=[CMakeExtension('spinqkit.spinq_backends')],
     install_requires=['numpy', 'scipy', 'psutil', 'retworkx', 'python-igraph==0.9.10', 'pybind11', 'antlr4-python3-runtime==4.9.2', 'python-constraint', 'requests', 'matplotlib>=3.5', 'pycryptodome==3.11.0'],
+    extras_require={'async': ['aiohttp>=3.8'], 'fast': ['orjson>=3.0']},
     python_requires='>=3.8',
     cmdclass=dict(build_ext=CMakeBuild),
     package_data={'spinqkit': ['compiler/qasm/include/qelib1.inc']},
@@ -17,5 +17,6 @@ from .qaoa import QAOA
 from .vqe import VQE
 from .quantum_counting import QuantumCounting
 from .optimizer import *
+from .gradient import *
 from .random_circuit import generate_random_circuit
 from .shor import Shor
\ No newline at end of file
@@ -0,0 +1,156 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Union
+from math import cos, sin
+from cmath import exp
+import numpy as np
+from spinqkit.compiler.ir import IntermediateRepresentation
+from spinqkit.backend.statevector_util import flatten_ir, operation_matrix, apply_matrix, initial_state, condition_satisfied
+from spinqkit.primitive import apply_pauli_sum
+
+def _merge(a: Dict, b: Dict, scale: float = 1.0) -> Dict:
+    merged = dict(a)
+    for k, w in b.items():
+        merged[k] = merged.get(k, 0.0) + scale * w
+    return merged
+
+def _scale(a: Dict, scale: float) -> Dict:
+    return {k: scale * w for k, w in a.items()}
+
+class TracedFloat(float):
+    '''
+    A float which remembers its partial derivatives to the trainable parameters.
+    The derivatives are carried through +, -, *, / and ** with a constant exponent,
+    so the parameter lambdas of a gate builder produce traced gate angles in the IR.
+    '''
+    def __new__(cls, value: float, partials: Dict[int, float]):
+        obj = float.__new__(cls, value)
+        obj.partials = partials
+        return obj
+
+    def __add__(self, other):
+        if isinstance(other, TracedFloat):
+            return TracedFloat(float(self) + float(other), _merge(self.partials, other.partials))
+        return TracedFloat(float(self) + other, self.partials)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, TracedFloat):
+            return TracedFloat(float(self) - float(other), _merge(self.partials, other.partials, -1.0))
+        return TracedFloat(float(self) - other, self.partials)
+
+    def __rsub__(self, other):
+        return TracedFloat(other - float(self), _scale(self.partials, -1.0))
+
+    def __mul__(self, other):
+        if isinstance(other, TracedFloat):
+            partials = _merge(_scale(self.partials, float(other)), other.partials, float(self))
+            return TracedFloat(float(self) * float(other), partials)
+        return TracedFloat(float(self) * other, _scale(self.partials, other))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, TracedFloat):
+            return self * other.__rtruediv__(1.0)
+        return TracedFloat(float(self) / other, _scale(self.partials, 1.0 / other))
+
+    def __rtruediv__(self, other):
+        value = float(self)
+        return TracedFloat(other / value, _scale(self.partials, -other / (value * value)))
+
+    def __neg__(self):
+        return TracedFloat(-float(self), _scale(self.partials, -1.0))
+
+    def __pos__(self):
+        return self
+
+    def __pow__(self, exponent):
+        if isinstance(exponent, TracedFloat):
+            raise TypeError('The exponent of a traced parameter must be a constant.')
+        value = float(self)
+        return TracedFloat(value ** exponent, _scale(self.partials, exponent * value ** (exponent - 1)))
+
+def trace_parameters(params: np.ndarray) -> List:
+    '''
+    Return the parameters as nested lists of TracedFloat, where the element at flat index k has the partial {k: 1}.
+    '''
+    params = np.asarray(params, dtype=float)
+    flat = [TracedFloat(v, {k: 1.0}) for k, v in enumerate(params.ravel())]
+    if params.ndim <= 1:
+        return flat
+    return np.array(flat, dtype=object).reshape(params.shape).tolist()
+
+def _gate_derivatives(name: str, params: List) -> List[np.ndarray]:
+    '''
+    The derivatives of a gate matrix to each of its parameters.
+    '''
+    if name in ('Rx', 'Ry', 'Rz'):
+        theta = float(params[0])
+        c, s = cos(theta / 2), sin(theta / 2)
+        if name == 'Rx':
+            return [np.array([[-s, -1j * c], [-1j * c, -s]], dtype=complex) / 2]
+        if name == 'Ry':
+            return [np.array([[-s, -c], [c, -s]], dtype=complex) / 2]
+        return [np.array([[-1j * exp(-0.5j * theta), 0], [0, 1j * exp(0.5j * theta)]], dtype=complex) / 2]
+    if name == 'P':
+        return [np.array([[0, 0], [0, 1j * exp(1j * float(params[0]))]], dtype=complex)]
+    if name == 'U':
+        theta, phi, lamda = float(params[0]), float(params[1]), float(params[2])
+        c, s = cos(theta / 2), sin(theta / 2)
+        dtheta = np.array([[-s, -exp(1j * lamda) * c], [exp(1j * phi) * c, -exp(1j * (phi + lamda)) * s]], dtype=complex) / 2
+        dphi = np.array([[0, 0], [1j * exp(1j * phi) * s, 1j * exp(1j * (phi + lamda)) * c]], dtype=complex)
+        dlamda = np.array([[0, -1j * exp(1j * lamda) * s], [0, 1j * exp(1j * (phi + lamda)) * c]], dtype=complex)
+        return [dtheta, dphi, dlamda]
+    raise ValueError('The gate ' + name + ' is not differentiable.')
+
+def _apply_hamiltonian(state: np.ndarray, hamiltonian: Union[np.ndarray, List]) -> np.ndarray:
+    if isinstance(hamiltonian, list):
+        return apply_pauli_sum(state.ravel(), hamiltonian).reshape(state.shape)
+    return (np.asarray(hamiltonian) @ state.ravel()).reshape(state.shape)
+
+def calculate_adjoint_gradient(ir: IntermediateRepresentation, hamiltonian: Union[np.ndarray, List], param_num: int) -> np.ndarray:
+    '''
+    Calculate the gradient of <psi|H|psi> to the trainable parameters with one forward and one backward sweep.
+    The IR is built from TracedFloat parameters, and the gradients of the traced Rx, Ry, Rz, P and U angles
+    are collected into a flat array of length param_num by the chain rule.
+    Hamiltonian is a matrix or a list of (pauli string, coeff).
+    '''
+    ops = [op for op in flatten_ir(ir) if condition_satisfied(op.condition, {})]
+    matrices = []
+    psi = initial_state(ir.qnum)
+    for op in ops:
+        if op.name == 'MEASURE':
+            raise ValueError('The adjoint gradient does not support measurements.')
+        mat = operation_matrix(op)
+        matrices.append(mat)
+        psi = apply_matrix(psi, mat, op.qubits)
+
+    grads = np.zeros(param_num, dtype=float)
+    lam = _apply_hamiltonian(psi, hamiltonian)
+    for op, mat in zip(reversed(ops), reversed(matrices)):
+        inv = mat.conj().T
+        psi = apply_matrix(psi, inv, op.qubits)
+        traced = [(j, p) for j, p in enumerate(op.params) if isinstance(p, TracedFloat) and len(p.partials) > 0]
+        if len(traced) > 0:
+            derivatives = _gate_derivatives(op.name, op.params)
+            for j, p in traced:
+                dpsi = apply_matrix(psi, derivatives[j], op.qubits)
+                g = 2 * np.real(np.vdot(lam, dpsi))
+                for k, w in p.partials.items():
+                    grads[k] += g * w
+        lam = apply_matrix(lam, inv, op.qubits)
+    return grads
@@ -0,0 +1,120 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Callable, Hashable, List, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+import numpy as np
+from spinqkit.compiler.ir import IntermediateRepresentation
+
+def get_executor(kind: str = 'thread', max_workers: Optional[int] = None) -> Executor:
+    '''
+    A thread pool for the shifted evaluations. It suits the backends which wait on the network, e.g., the cloud,
+    and the basic simulator, which releases the GIL while it simulates. There is no process pool, since the
+    evaluations of the solvers hold gates with lambda parameters and backends, which cannot be pickled.
+    '''
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    raise ValueError('Unknown executor kind ' + kind)
+
+def _bound_angles(gate, params: List, angles: List):
+    # expand the factors like the native compiler
+    for f in gate.factors:
+        sub_params = np.ravel(np.asarray([f[2](params)] if len(f) > 2 else [], dtype=float))
+        if f[0] in IntermediateRepresentation.basis_set:
+            # the matrices of the basis gates have the period 4*pi in each angle
+            angles.extend(np.mod(sub_params, 4 * np.pi))
+        elif len(f[0].factors) > 0:
+            _bound_angles(f[0], sub_params.tolist(), angles)
+        else:
+            angles.extend(sub_params)
+
+def gate_angles_key(gate, shape: Optional[Tuple] = None) -> Callable[[np.ndarray], Hashable]:
+    '''
+    Return a key_func which maps a parameter set to the angles of the basic gates of gate bound to it.
+    The parameter sets with the same angles build the same circuit.
+    The parameter set is reshaped to shape and passed to the gate as a list, like the ansatz of VQE.
+    '''
+    def key(params: np.ndarray) -> Hashable:
+        param_list = np.reshape(params, shape).tolist() if shape is not None else list(params)
+        angles = []
+        _bound_angles(gate, param_list, angles)
+        return np.round(np.asarray(angles, dtype=float), 12).tobytes()
+    return key
+
+def allocate_shots(weights: List[float], shots: int) -> np.ndarray:
+    '''
+    Split the shots in proportion to the weights by the largest remainder, giving at least one shot to each weight.
+    '''
+    weights = np.abs(np.asarray(weights, dtype=float))
+    if shots < len(weights):
+        raise ValueError('The shots are fewer than the terms.')
+    if weights.sum() <= 0:
+        weights = np.ones_like(weights)
+    quota = 1 + weights / weights.sum() * (shots - len(weights))
+    alloc = np.floor(quota).astype(int)
+    rest = shots - alloc.sum()
+    if rest > 0:
+        alloc[np.argsort(alloc - quota)[:rest]] += 1
+    return alloc
+
+class ParameterShiftGradient(object):
+    def __init__(self, evaluate: Callable, executor: Optional[Executor] = None, shift: float = np.pi / 2,
+                 key_func: Optional[Callable[[np.ndarray], Hashable]] = None):
+        '''
+        evaluate(params, *args) returns the loss of a flat parameter array.
+        All the shifted parameter sets of a gradient are generated up front, the sets with the same key are
+        evaluated only once, and the rest are dispatched together through the executor.
+        Without an executor, they are evaluated one by one.
+        key_func maps a parameter set to a hashable key of its circuit, the rounded parameters by default,
+        which are only equal for equal sets. gate_angles_key keys a parameterized gate on its bound angles.
+        An instance can be used directly as the grad_func of an optimizer.
+        '''
+        self.__evaluate = evaluate
+        self.__executor = executor
+        self.__shift = shift
+        self.__key_func = key_func if key_func is not None else self._default_key
+
+    @staticmethod
+    def _default_key(params: np.ndarray) -> Hashable:
+        return np.round(params, 12).tobytes()
+
+    def shifted_parameters(self, params: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Return the distinct shifted parameter sets, and for each parameter the row of its +shift and -shift set.
+        '''
+        flat = np.asarray(params, dtype=float).ravel()
+        offsets = self.__shift * np.eye(len(flat))
+        candidates = np.concatenate([flat + offsets, flat - offsets])
+        rows = {}
+        unique = []
+        index = np.empty(len(candidates), dtype=int)
+        for i, c in enumerate(candidates):
+            key = self.__key_func(c)
+            if key not in rows:
+                rows[key] = len(unique)
+                unique.append(c)
+            index[i] = rows[key]
+        return np.array(unique).reshape(-1, len(flat)), index[:len(flat)], index[len(flat):]
+
+    def evaluate_all(self, param_sets: np.ndarray, *args) -> np.ndarray:
+        if self.__executor is None:
+            return np.array([self.__evaluate(p, *args) for p in param_sets], dtype=float)
+        futures = [self.__executor.submit(self.__evaluate, p, *args) for p in param_sets]
+        return np.array([f.result() for f in futures], dtype=float)
+
+    def __call__(self, params: np.ndarray, *args) -> np.ndarray:
+        param_sets, plus, minus = self.shifted_parameters(params)
+        values = self.evaluate_all(param_sets, *args)
+        grads = (values[plus] - values[minus]) / (2 * np.sin(self.__shift))
+        return grads.reshape(np.shape(params))
@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from spinqkit import get_compiler, BasicSimulatorBackend, BasicSimulatorConfig
+from spinqkit.backend.sampling import sample_readings
 from spinqkit.model import Gate, GateBuilder, Circuit, RepeatBuilder, ControlledGate, InverseBuilder
 from spinqkit.model import H, X, P, CX, SWAP
 from spinqkit.primitive import QFT
 
-from typing import List, Any
+from typing import List, Any, Optional
 import numpy as np
 from fractions import Fraction
 from math import gcd
@@ -43,18 +44,20 @@ class Shor(object):
             return result
         return None
     
-    def get_factor(self, a: int) -> List:
+    def get_factor(self, a: int, seed: Optional[int] = None) -> List:
         if not isinstance(a, int) or a < 2 or a > self.N or gcd(a, self.N) != 1:
             raise ValueError('The a value is invalid.')
         self.a = a
         result = self.get_quantum_result()
+        # draw all the readings at once instead of one reading per attempt
+        readings = sample_readings(result, Shor.repeat_limit, seed=seed)
         attempt = 0
         factor_found = False
         factors = []
         while not factor_found and attempt < Shor.repeat_limit:
+            reading = readings[attempt]
             attempt = attempt + 1
-            reading = result.get_random_reading()
-            phase = int(reading, 2) / (2**(self.N.bit_length()*2))
+            phase = int(reading) / (2**(self.N.bit_length()*2))
             if phase != 0:
                 frac = Fraction(phase).limit_denominator(self.N)
                 r = frac.denominator
@@ -12,13 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from typing import List, Union, Any
+from concurrent.futures import Executor
+import copy
 import numpy as np
 from spinqkit import get_compiler
 from spinqkit.model import Gate, Circuit, GateBuilder, InappropriateBackendError
 from spinqkit import Rx, Ry, Rz, CX, I, X, Y, Z
-from spinqkit import PauliBuilder, calculate_pauli_expectation, generate_hamiltonian_matrix
+from spinqkit import MeasurementBasisBuilder, generate_hamiltonian_matrix, calculate_state_expectation
+from spinqkit import calculate_pauli_sum_expectation, group_qubit_wise_commuting
 from spinqkit.backend import BasicSimulatorBackend
 from .optimizer import Optimizer
+from .gradient import trace_parameters, calculate_adjoint_gradient, ParameterShiftGradient, gate_angles_key, allocate_shots
 
 class VQE(object):
     def __init__(self,
@@ -27,11 +31,17 @@ class VQE(object):
         hamiltonian: Union[np.ndarray, List],
         optimizer: Optimizer,
         ansatz: Gate = None,
-        ansatz_params: List = None):
+        ansatz_params: List = None,
+        executor: Executor = None,
+        shot_budget: int = None):
         '''
         Hamiltonian is a matrix or a list of (pauli string, coeff). 
         If it is a matrix, the expection value is calculated through matrix multiplication.
-        If it is a list, the expection value is calculated through pauli measurements.
+        If it is a list, the expection value is calculated from the state vector with a simulator backend,
+        otherwise through pauli measurements. Qubit-wise commuting terms share one measurement circuit.
+        The executor runs the shifted evaluations of the parameter shift gradient concurrently.
+        If shot_budget is given, the shots of one loss evaluation are split over the measurement circuits
+        in proportion to the sum of the absolute coefficients of their terms.
         '''
         self.__qubit_num = qubit_num
         self.__depth = depth
@@ -41,17 +51,25 @@ class VQE(object):
             self.__ansatz = ansatz
         else:
             self.__ansatz = self._generate_ansatz()
+        self.__measurement_groups = group_qubit_wise_commuting(hamiltonian) if isinstance(hamiltonian, list) else None
         if ansatz_params is not None:
             self.__ansatz_params = ansatz_params
         else:
             self.__ansatz_params = np.random.uniform(0,2*np.pi,(self.__qubit_num, 3*self.__depth))
         self.__circuit = self._build()
+        self.__shot_budget = shot_budget
+        # the shifted parameter sets which bind the same ansatz angles are evaluated once
+        key_func = gate_angles_key(self.__ansatz, np.shape(self.__ansatz_params))
+        self.__shift_gradient = ParameterShiftGradient(self.evaluate, executor, key_func=key_func)
 
-    def _build(self, h: Gate = None) -> Circuit:
+    def _build(self, h: Gate = None, param_list: List = None) -> Circuit:
         circ = Circuit()
         qubits = circ.allocateQubits(self.__qubit_num)
-        param_list = self.__ansatz_params.tolist()
+        if param_list is None:
+            param_list = self.__ansatz_params.tolist()
         circ << (self.__ansatz, qubits, param_list)
+        if h is not None:
+            circ << (h, qubits)
         return circ
 
     def _generate_ansatz(self):
@@ -88,43 +106,70 @@ class VQE(object):
         '''
         return self.__circuit
 
-    def loss_func(self, params: np.ndarray, backend, config) -> float:
+    def evaluate(self, params: np.ndarray, backend, config) -> float:
+        '''
+        Calculate the loss of the parameters without changing the state of the solver, 
+        so the evaluations can run concurrently.
+        '''
         compiler = get_compiler("native")
         optimization_level = 0
         value = 0.0
-        self.__ansatz_params = params.reshape(self.__ansatz_params.shape)
+        param_list = np.reshape(params, self.__ansatz_params.shape).tolist()
         if isinstance(self.__H, np.ndarray):
             if isinstance(backend, BasicSimulatorBackend):
-                self.__circuit = self._build()
-                exe = compiler.compile(self.__circuit, optimization_level)
+                exe = compiler.compile(self._build(param_list=param_list), optimization_level)
                 result = backend.execute(exe, config)
-                psi = np.array(result.states)
+                psi = np.asarray(result.states)
                 value = np.real(psi @ self.__H @ psi.conj().T)
             else:
                 raise InappropriateBackendError('Only a simulator backend supports the state calculation.')
+        elif isinstance(backend, BasicSimulatorBackend):
+            exe = compiler.compile(self._build(param_list=param_list), optimization_level)
+            result = backend.execute(exe, config)
+            value = calculate_state_expectation(np.asarray(result.states), self.__H)
         else:
-            for pstr, coeff in self.__H:
-                part = PauliBuilder(pstr).to_gate()
-                part_circ = self._build(part)
+            if self.__shot_budget is not None:
+                weights = [sum(abs(coeff) for _, coeff in terms) for _, terms in self.__measurement_groups]
+                group_shots = allocate_shots(weights, self.__shot_budget)
+            for k, (basis, terms) in enumerate(self.__measurement_groups):
+                part = MeasurementBasisBuilder(basis).to_gate()
+                part_circ = self._build(part, param_list)
                 exe = compiler.compile(part_circ, optimization_level)
-                result = backend.execute(exe, config)
-                value += coeff * calculate_pauli_expectation(pstr, result.probabilities)
+                if self.__shot_budget is not None:
+                    group_config = copy.deepcopy(config)
+                    group_config.configure_shots(int(group_shots[k]))
+                    result = backend.execute(exe, group_config)
+                else:
+                    result = backend.execute(exe, config)
+                value += calculate_pauli_sum_expectation(terms, result.probabilities)
 
         return value
 
+    def loss_func(self, params: np.ndarray, backend, config) -> float:
+        self.__ansatz_params = np.reshape(params, self.__ansatz_params.shape)
+        self.__circuit = self._build()
+        return self.evaluate(params, backend, config)
+
     def gradient(self, params: np.ndarray, backend, config):
-            params_p = params.flatten()
-            params_m = params.flatten()
-            grads = np.ones_like(params_p)
-            for i in range(len(params_p)):
-                ori_p = params_p[i]
-                ori_m = params_m[i]
-                params_p[i] = ori_p + np.pi / 2
-                params_m[i] = ori_m - np.pi / 2
-                grads[i] = (self.loss_func(params_p, backend, config) - self.loss_func(params_m, backend, config)) / 2
-                params_p[i] = ori_p
-                params_m[i] = ori_m
-            return grads.reshape(params.shape)
+        '''
+        Calculate the gradient by the parameter shift rule. The shifted evaluations are dispatched together 
+        through the executor of the solver.
+        '''
+        return self.__shift_gradient(params, backend, config)
+
+    def adjoint_gradient(self, params: np.ndarray, backend, config):
+        '''
+        Calculate the gradient with the adjoint method, which costs about one extra simulation regardless of the 
+        number of parameters. It can be used as the grad_func of run. Only the Rx, Ry, Rz, P and U angles are 
+        differentiated, so the ansatz must not put the parameters into matrix gates.
+        '''
+        if not isinstance(backend, BasicSimulatorBackend):
+            raise InappropriateBackendError('Only a simulator backend supports the adjoint gradient.')
+        traced = trace_parameters(np.reshape(params, self.__ansatz_params.shape))
+        circ = self._build(param_list=traced)
+        exe = get_compiler("native").compile(circ, 0)
+        grads = calculate_adjoint_gradient(exe, self.__H, np.size(params))
+        return grads.reshape(np.shape(params))
 
     def run(self, backend: Any, config: Any, grad_func = None):
         if grad_func is None:
@@ -14,4 +14,14 @@
 
 from .backend import *
 from .basic_simulator_backend import BasicSimulatorConfig
-from .triangulum_backend import TriangulumConfig
\ No newline at end of file
+from .triangulum_backend import TriangulumConfig
+from .sampling import sample_readings, sample_counts, probabilities_to_array
+from .spinq_cloud_backend import SpinQCloudConfig
+from .async_execution import ExecutionFuture, gather
+from .prefix_cache import PrefixStateCache
+from .simulator_result import SimulatorResult
+from .unitary_simulator_backend import UnitarySimulatorBackend, UnitarySimulatorConfig, calculate_unitary
+from .backend_selector import AutoBackend, CircuitProfile, ResourceEstimate, analyze_circuit, estimate_resources
+from .task_watcher import TaskWatcher, TaskFuture
+from .result_cache import ResultCache
+from .cloud_catalog import CloudCatalog, shared_catalog
@@ -0,0 +1,144 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Callable, List, Optional, Tuple
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, CancelledError
+import asyncio
+import threading
+import time
+
+DEFAULT_MAX_WORKERS = 4
+
+class ExecutionFuture(object):
+    '''
+    The handle of an asynchronous execution. It can be waited on with result() or awaited in a coroutine.
+    cancel() drops a pending execution. A running execution stops at its next check if it supports cancellation,
+    e.g., a cloud task waiting for its result; otherwise it runs to the end.
+    '''
+    def __init__(self, future: Future, cancel_event: threading.Event):
+        self._future = future
+        self._cancel_event = cancel_event
+
+    def cancel(self) -> bool:
+        self._cancel_event.set()
+        return self._future.cancel()
+
+    def cancelled(self) -> bool:
+        if self._future.cancelled():
+            return True
+        return self._cancel_event.is_set() and self._future.done() and isinstance(self._future.exception(), CancelledError)
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def running(self) -> bool:
+        return self._future.running()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        return self._future.result(timeout)
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        return self._future.exception(timeout)
+
+    def add_done_callback(self, fn: Callable):
+        self._future.add_done_callback(lambda f: fn(self))
+
+    def __await__(self):
+        return asyncio.wrap_future(self._future).__await__()
+
+def _run(cancel_event: threading.Event, fn: Callable, pass_cancel_event: bool, args: Tuple):
+    if cancel_event.is_set():
+        raise CancelledError()
+    if pass_cancel_event:
+        return fn(*args, cancel_event=cancel_event)
+    return fn(*args)
+
+class AsyncExecutor(object):
+    '''
+    A bounded pool for the executions of one backend.
+    A thread pool is used by default, any concurrent.futures executor can be given instead.
+    '''
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, executor: Optional[Executor] = None):
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__executor = executor
+
+    def submit(self, fn: Callable, *args, pass_cancel_event: bool = False) -> ExecutionFuture:
+        '''
+        If pass_cancel_event is True, fn is called with the keyword argument cancel_event,
+        a threading.Event which is set when the execution is cancelled.
+        '''
+        cancel_event = threading.Event()
+        future = self.__executor.submit(_run, cancel_event, fn, pass_cancel_event, args)
+        return ExecutionFuture(future, cancel_event)
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+class AsyncExecutionMixin(object):
+    '''
+    Add execute_async to a backend with an execute(ir, config) method.
+    Each backend instance owns one pool, which is created when it is first used.
+    '''
+    _executor_lock = threading.Lock()
+
+    def configure_executor(self, max_workers: int = DEFAULT_MAX_WORKERS, executor: Optional[Executor] = None):
+        with self._executor_lock:
+            old = getattr(self, '_async_executor', None)
+            self._async_executor = AsyncExecutor(max_workers, executor)
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def _get_async_executor(self) -> AsyncExecutor:
+        with self._executor_lock:
+            if getattr(self, '_async_executor', None) is None:
+                self._async_executor = AsyncExecutor()
+            return self._async_executor
+
+    def execute_async(self, ir, config) -> ExecutionFuture:
+        '''
+        Run execute(ir, config) on the pool of the backend.
+        '''
+        return self._get_async_executor().submit(self.execute, ir, config)
+
+    def shutdown_executor(self, wait: bool = True):
+        with self._executor_lock:
+            executor = getattr(self, '_async_executor', None)
+            self._async_executor = None
+        if executor is not None:
+            executor.shutdown(wait)
+
+def gather(backend: Any, jobs: List[Tuple[Any, Any]], timeout: Optional[float] = None,
+           return_exceptions: bool = False) -> List:
+    '''
+    Execute (ir, config) pairs concurrently on a backend and return the results in the order of the pairs.
+    If return_exceptions is True, a failed execution puts its exception in the list instead of raising it.
+    The unfinished executions are cancelled if one of them raises or the timeout expires.
+    '''
+    futures = [backend.execute_async(ir, config) for ir, config in jobs]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = []
+    try:
+        for f in futures:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if return_exceptions:
+                exc = f.exception(remaining)
+                results.append(exc if exc is not None else f.result())
+            else:
+                results.append(f.result(remaining))
+    except BaseException:
+        for f in futures:
+            f.cancel()
+        raise
+    return results
@@ -15,15 +15,36 @@
 from .basic_simulator_backend import BasicSimulatorBackend
 from .triangulum_backend import TriangulumBackend
 from .spinq_cloud_backend import SpinQCloudBackend
+from .unitary_simulator_backend import UnitarySimulatorBackend
+from .simulator_pool import SimulatorPool
+from .backend_selector import AutoBackend
+from threading import Lock
 
-BS = BasicSimulatorBackend()
-TB = TriangulumBackend()
+# The shared instances are created on first use. Each instance runs one execution at a time,
+# use a SimulatorPool to run simulations concurrently.
+_shared_backends = {}
+_shared_lock = Lock()
+
+def _get_shared_backend(backend_class):
+    with _shared_lock:
+        if backend_class not in _shared_backends:
+            _shared_backends[backend_class] = backend_class()
+        return _shared_backends[backend_class]
 
 def get_basic_simulator():
-    return BS
+    return _get_shared_backend(BasicSimulatorBackend)
 
 def get_triangulum():
-    return TB
+    return _get_shared_backend(TriangulumBackend)
+
+def get_unitary_simulator():
+    return _get_shared_backend(UnitarySimulatorBackend)
+
+def get_simulator_pool(size: int = 4):
+    return SimulatorPool(size)
+
+def get_auto_backend(memory_limit: int = None):
+    return AutoBackend(memory_limit)
 
 def get_spinq_cloud(username, signStr):
     return SpinQCloudBackend(username, signStr)
\ No newline at end of file
@@ -0,0 +1,276 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional, Union
+from math import pi
+import psutil
+from requests import RequestException
+from spinqkit.compiler import IntermediateRepresentation
+from spinqkit.model import InappropriateBackendError, NotFoundError, SpinQCloudServerError
+from .statevector_util import FlatOperation, flatten_ir, remove_terminal_measurements
+from .backend_util import marginalize_qubits
+from .component_simulation import qubit_components, simulate_component_states, combine_probabilities, combine_states
+from .simulator_result import SimulatorResult
+from .basic_simulator_backend import BasicSimulatorBackend, BasicSimulatorConfig
+from .async_execution import AsyncExecutionMixin
+
+STATEVECTOR = 'statevector'
+COMPONENTS = 'components'
+TRIANGULUM = 'triangulum'
+CLOUD = 'cloud'
+
+# Rough costs used to rank the engines, measured on a desktop CPU
+STATEVECTOR_BYTES_PER_AMPLITUDE = 56      # state, workspace, probabilities and the returned states
+COMPONENT_BYTES_PER_AMPLITUDE = 32        # component state and its temporary copy
+PROBABILITY_BYTES_PER_AMPLITUDE = 8
+STATE_BYTES_PER_AMPLITUDE = 16          # the tensor product state returned by the components engine
+STATEVECTOR_SECONDS_PER_AMPLITUDE = 2e-9  # per gate
+NUMPY_SECONDS_PER_AMPLITUDE = 5e-9        # per gate
+NUMPY_SECONDS_PER_GATE = 2e-5
+TRIANGULUM_SECONDS = 30.0
+TRIANGULUM_MAX_QUBITS = 3
+CLOUD_SECONDS = 60.0
+
+_clifford_gates = {'I', 'H', 'X', 'Y', 'Z', 'S', 'Sd', 'CX', 'CY', 'CZ', 'SWAP'}
+_rotation_gates = {'Rx', 'Ry', 'Rz', 'P'}
+
+def _is_clifford(op: FlatOperation) -> bool:
+    if op.matrix is not None:
+        return False
+    if op.name in _clifford_gates or op.name in ('MEASURE', 'BARRIER'):
+        return True
+    if op.name in _rotation_gates and len(op.params) == 1:
+        # a rotation by a multiple of pi/2
+        k = float(op.params[0]) / (pi / 2)
+        return abs(k - round(k)) < 1e-9
+    return False
+
+class CircuitProfile(object):
+    '''
+    The structure of a circuit which decides the engines able to run it and their cost.
+    components are the groups of qubits connected by multi-qubit gates.
+    '''
+    def __init__(self, qubit_num: int, clbit_num: int, ops: List[FlatOperation]):
+        self.qubit_num = qubit_num
+        self.clbit_num = clbit_num
+        self.gate_num = sum(1 for op in ops if op.name != 'MEASURE')
+        self.multi_qubit_gate_num = sum(1 for op in ops if op.name != 'MEASURE' and len(op.qubits) > 1)
+        self.measure_num = sum(1 for op in ops if op.name == 'MEASURE')
+        self.has_condition = any(op.condition is not None for op in ops)
+        self.clifford_only = all(_is_clifford(op) for op in ops)
+        try:
+            remove_terminal_measurements(ops)
+            self.mid_circuit_measurement = False
+        except ValueError:
+            self.mid_circuit_measurement = True
+        self.components = qubit_components(ops, qubit_num)
+        self.component_gate_nums = [0] * len(self.components)
+        component_of = {q: c for c, qubits in enumerate(self.components) for q in qubits}
+        for op in ops:
+            if op.name != 'MEASURE':
+                self.component_gate_nums[component_of[op.qubits[0]]] += 1
+
+    @property
+    def max_component_size(self) -> int:
+        return max([len(c) for c in self.components] + [0])
+
+    @property
+    def entangled(self) -> bool:
+        return self.max_component_size > 1
+
+    def __repr__(self) -> str:
+        return ('CircuitProfile(qubits=' + str(self.qubit_num) + ', gates=' + str(self.gate_num) +
+                ', multi_qubit_gates=' + str(self.multi_qubit_gate_num) + ', components=' +
+                str([len(c) for c in self.components]) + ', clifford_only=' + str(self.clifford_only) + ')')
+
+def analyze_circuit(ir: IntermediateRepresentation) -> CircuitProfile:
+    ops = flatten_ir(ir)
+    qubit_num = ir.dag['qnum'] if 'qnum' in ir.dag.attributes() else ir.qnum
+    clbit_num = ir.dag['cnum'] if 'cnum' in ir.dag.attributes() else 0
+    return CircuitProfile(qubit_num, clbit_num, ops)
+
+class ResourceEstimate(object):
+    '''
+    The estimated peak memory in bytes and wall time in seconds of an engine for a circuit.
+    If supported is False, reason tells why the engine cannot run the circuit.
+    '''
+    def __init__(self, engine: str, memory: int, time: float, supported: bool = True, reason: str = ''):
+        self.engine = engine
+        self.memory = memory
+        self.time = time
+        self.supported = supported
+        self.reason = reason
+
+    def fits(self, memory_limit: Optional[int]) -> bool:
+        return self.supported and (memory_limit is None or self.memory <= memory_limit)
+
+    def __repr__(self) -> str:
+        text = 'ResourceEstimate(' + self.engine + ', memory=' + _format_bytes(self.memory) + ', time=' + \
+               '{:.3g}s'.format(self.time)
+        if not self.supported:
+            text += ', unsupported: ' + self.reason
+        return text + ')'
+
+def _format_bytes(n: int) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if n < 1024 or unit == 'TiB':
+            return '{:.4g}{}'.format(n, unit)
+        n /= 1024.0
+
+def _estimate_statevector(profile: CircuitProfile) -> ResourceEstimate:
+    amplitudes = 2 ** profile.qubit_num
+    return ResourceEstimate(STATEVECTOR, STATEVECTOR_BYTES_PER_AMPLITUDE * amplitudes,
+                            STATEVECTOR_SECONDS_PER_AMPLITUDE * amplitudes * max(1, profile.gate_num))
+
+def _estimate_components(profile: CircuitProfile) -> ResourceEstimate:
+    memory = PROBABILITY_BYTES_PER_AMPLITUDE * 2 ** profile.qubit_num
+    memory += COMPONENT_BYTES_PER_AMPLITUDE * max([2 ** len(c) for c in profile.components] + [1])
+    time = sum(n * (NUMPY_SECONDS_PER_GATE + NUMPY_SECONDS_PER_AMPLITUDE * 2 ** len(c))
+               for c, n in zip(profile.components, profile.component_gate_nums))
+    # the outer product of the component probabilities
+    time += NUMPY_SECONDS_PER_AMPLITUDE * 2 ** profile.qubit_num
+    estimate = ResourceEstimate(COMPONENTS, memory, time)
+    if len(profile.components) < 2:
+        estimate.supported, estimate.reason = False, 'the qubits form one component'
+    elif profile.has_condition or profile.mid_circuit_measurement:
+        estimate.supported, estimate.reason = False, 'conditions and mid-circuit measurements are not supported'
+    return estimate
+
+def _estimate_triangulum(profile: CircuitProfile) -> ResourceEstimate:
+    estimate = ResourceEstimate(TRIANGULUM, 0, TRIANGULUM_SECONDS)
+    if profile.qubit_num > TRIANGULUM_MAX_QUBITS:
+        estimate.supported, estimate.reason = False, 'more than ' + str(TRIANGULUM_MAX_QUBITS) + ' qubits'
+    elif profile.has_condition or profile.measure_num > 0:
+        estimate.supported, estimate.reason = False, 'conditions and measurements are not supported'
+    return estimate
+
+def _estimate_cloud(profile: CircuitProfile, max_qubits: Optional[int]) -> ResourceEstimate:
+    estimate = ResourceEstimate(CLOUD, 0, CLOUD_SECONDS)
+    if max_qubits is not None and profile.qubit_num > max_qubits:
+        estimate.supported, estimate.reason = False, 'the platform has ' + str(max_qubits) + ' qubits'
+    return estimate
+
+def estimate_resources(circuit: Union[IntermediateRepresentation, CircuitProfile], engines: Optional[List[str]] = None,
+                       cloud_max_qubits: Optional[int] = None) -> Dict[str, ResourceEstimate]:
+    '''
+    Estimate the memory and time of each engine for an IR or its profile, without running anything.
+    The engines are statevector (the basic simulator), components (each group of connected qubits simulated
+    on its own state), triangulum and cloud.
+    '''
+    profile = circuit if isinstance(circuit, CircuitProfile) else analyze_circuit(circuit)
+    if engines is None:
+        engines = [STATEVECTOR, COMPONENTS, TRIANGULUM, CLOUD]
+    estimators = {STATEVECTOR: _estimate_statevector, COMPONENTS: _estimate_components,
+                  TRIANGULUM: _estimate_triangulum, CLOUD: lambda p: _estimate_cloud(p, cloud_max_qubits)}
+    return {e: estimators[e](profile) for e in engines}
+
+def available_memory() -> int:
+    '''
+    The memory which can be used without swapping.
+    '''
+    return psutil.virtual_memory().available
+
+class AutoBackend(AsyncExecutionMixin):
+    '''
+    Inspect an IR before the execution and run it on the fastest engine within the memory limit.
+    The simulator engines are always available, Triangulum and the cloud after they are configured.
+    InappropriateBackendError with the estimates is raised if no engine fits.
+    '''
+    def __init__(self, memory_limit: Optional[int] = None, simulator: Optional[BasicSimulatorBackend] = None):
+        self.memory_limit = memory_limit
+        self.__simulator = simulator
+        self.__triangulum = None
+        self.__cloud = None
+
+    def configure_triangulum(self, config, backend=None):
+        if backend is None:
+            from .backend import get_triangulum
+            backend = get_triangulum()
+        self.__triangulum = (backend, config)
+
+    def configure_cloud(self, backend, config):
+        self.__cloud = (backend, config)
+
+    def engines(self) -> List[str]:
+        engines = [STATEVECTOR, COMPONENTS]
+        if self.__triangulum is not None:
+            engines.append(TRIANGULUM)
+        if self.__cloud is not None:
+            engines.append(CLOUD)
+        return engines
+
+    def _cloud_max_qubits(self) -> Optional[int]:
+        if self.__cloud is None:
+            return None
+        backend, config = self.__cloud
+        try:
+            return backend.get_platform(config.metadata['platform_code']).max_bitnum
+        except (NotFoundError, SpinQCloudServerError, RequestException):
+            # the cloud is unknown to the estimate, not an error of the local engines
+            return None
+
+    def estimate(self, ir: IntermediateRepresentation) -> Dict[str, ResourceEstimate]:
+        return estimate_resources(analyze_circuit(ir), self.engines(), self._cloud_max_qubits())
+
+    def select(self, ir: IntermediateRepresentation) -> ResourceEstimate:
+        estimates = self.estimate(ir)
+        memory_limit = self._memory_limit()
+        candidates = [e for e in estimates.values() if e.fits(memory_limit)]
+        if len(candidates) == 0:
+            raise InappropriateBackendError('No engine can run the circuit within the memory limit ' + _format_bytes(memory_limit) + ':',
+                                            ', '.join(repr(e) for e in estimates.values()))
+        return min(candidates, key=lambda e: e.time)
+
+    def _simulator(self) -> BasicSimulatorBackend:
+        if self.__simulator is None:
+            from .backend import get_basic_simulator
+            self.__simulator = get_basic_simulator()
+        return self.__simulator
+
+    def _memory_limit(self) -> int:
+        return self.memory_limit if self.memory_limit is not None else available_memory()
+
+    def execute(self, ir: IntermediateRepresentation, config: Optional[BasicSimulatorConfig] = None):
+        '''
+        config is used by the simulator engines, the remote engines use their configured configs.
+        select(ir) tells the engine which is chosen. The fields of the result depend on the engine:
+        statevector returns the result of the basic simulator with the probabilities and the states,
+        components a SimulatorResult with the probabilities, and the states if the whole state fits
+        in the memory limit besides the estimate, otherwise the states are empty,
+        triangulum and cloud the results of their backends without the states.
+        '''
+        if config is None:
+            config = BasicSimulatorConfig()
+        estimate = self.select(ir)
+        if estimate.engine == STATEVECTOR:
+            return self._simulator().execute(ir, config)
+        if estimate.engine == COMPONENTS:
+            return self._execute_components(ir, config, estimate)
+        backend, remote_config = self.__triangulum if estimate.engine == TRIANGULUM else self.__cloud
+        return backend.execute(ir, remote_config)
+
+    def _execute_components(self, ir: IntermediateRepresentation, config: BasicSimulatorConfig,
+                            estimate: ResourceEstimate) -> SimulatorResult:
+        ops = remove_terminal_measurements(flatten_ir(ir))
+        qubit_num = ir.dag['qnum']
+        components = qubit_components(ops, qubit_num)
+        component_states = simulate_component_states(ops, components)
+        probs = combine_probabilities(component_states, components)
+        states = None
+        if estimate.memory + STATE_BYTES_PER_AMPLITUDE * 2 ** qubit_num <= self._memory_limit():
+            states = combine_states(component_states, components)
+        mqubits = config.metadata.get('mqubits')
+        if mqubits is not None and 0 < len(set(mqubits)) < qubit_num:
+            probs = marginalize_qubits(probs, sorted(q for q in set(mqubits) if 0 <= q < qubit_num))
+        return SimulatorResult(probs, states, shots=config.metadata.get('shots', 1024))
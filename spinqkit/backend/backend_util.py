@@ -13,29 +13,55 @@
 # limitations under the License.
 
 from typing import List
+import numpy as np
 from igraph import Graph
 from spinqkit.compiler import IntermediateRepresentation, NodeType
 
 def get_graph_capsule(graph: Graph):
     return graph.__graph_as_capsule()
 
-def map_results(probabilities: List, qubit_mapping: List) -> List:
-    qubit_num = len(qubit_mapping)
-    zero_probabilitiess = [0.0] * qubit_num
-    for i in range(len(probabilities)):
-        for j in range(qubit_num):
-            if (i >> (qubit_num - qubit_mapping[j] - 1)) & 1 == 0:
-                zero_probabilitiess[j] += probabilities[i]
-
-    logical_probabilities = [1.0] * (2 ** qubit_num)
-    for k in range(len(logical_probabilities)):
-        for q in range(qubit_num):
-            if ((k >> (qubit_num - q - 1)) & 1) == 0:
-                logical_probabilities[k] *= zero_probabilitiess[q]
-            else:
-                logical_probabilities[k] *= (1.0 - zero_probabilitiess[q])
-
-    return logical_probabilities
+def _qubit_num(array: np.ndarray) -> int:
+    qubit_num = int(np.log2(len(array)))
+    if 2 ** qubit_num != len(array):
+        raise ValueError('The length of the array must be a power of 2.')
+    return qubit_num
+
+def permute_qubits(array: np.ndarray, permutation: List[int]) -> np.ndarray:
+    '''
+    Reorder the qubits of a 2^n array indexed by basis state, where qubit 0 is the most significant bit.
+    Qubit i of the returned array is qubit permutation[i] of the input array.
+    '''
+    array = np.asarray(array)
+    qubit_num = _qubit_num(array)
+    if sorted(permutation) != list(range(qubit_num)):
+        raise ValueError('The permutation is invalid.')
+    return array.reshape((2,) * qubit_num).transpose(permutation).reshape(-1)
+
+def marginalize_qubits(probabilities: np.ndarray, qubits: List[int]) -> np.ndarray:
+    '''
+    Sum out all the qubits not in the qubits list. The kept qubits follow the order in the list.
+    '''
+    probabilities = np.asarray(probabilities)
+    qubit_num = _qubit_num(probabilities)
+    if len(set(qubits)) != len(qubits) or any(q < 0 or q >= qubit_num for q in qubits):
+        raise ValueError('The qubits to keep are invalid.')
+    others = tuple(q for q in range(qubit_num) if q not in qubits)
+    tensor = probabilities.reshape((2,) * qubit_num).sum(axis=others)
+    # the remaining axes are in ascending qubit order after the sum
+    order = sorted(qubits)
+    return tensor.transpose([order.index(q) for q in qubits]).reshape(-1)
+
+def reverse_bit_order(array: np.ndarray) -> np.ndarray:
+    array = np.asarray(array)
+    qubit_num = _qubit_num(array)
+    return permute_qubits(array, list(range(qubit_num))[::-1])
+
+def map_results(probabilities: List, qubit_mapping: List) -> np.ndarray:
+    '''
+    The probabilities are indexed by physical qubits and qubit_mapping[j] is the physical qubit of logical qubit j.
+    Return the joint probabilities indexed by logical qubits.
+    '''
+    return permute_qubits(probabilities, list(qubit_mapping))
 
 def analyze_connectivity(ir: IntermediateRepresentation) -> List:
     connectivity = []
@@ -12,9 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List
+from typing import List, Optional
+from threading import Lock
+import time
 from igraph import Graph
 from .backend_util import get_graph_capsule
+from .async_execution import AsyncExecutionMixin
+from .statevector_util import flatten_ir, remove_terminal_measurements
+from .prefix_cache import PrefixStateCache, prefix_keys
+from .simulator_result import SimulatorResult
+from .branching_simulation import simulate_branches, branching_result
 from spinqkit.compiler import IntermediateRepresentation, NodeType
 from spinqkit.model import Instruction
 from spinqkit.model import I, H, X, Y, Z, Rx, Ry, Rz, T, Td, S, Sd, P, CX, CY, CZ, SWAP, CCX, U
@@ -24,6 +31,9 @@ from spinqkit.spinq_backends import BasicSimulator
 class BasicSimulatorConfig:
     def __init__(self):
         self.metadata = {}
+        self.prefix_cache = None
+        self.branching = False
+        self.seed = None
 
     def configure_shots(self, shots: int):
         self.metadata['shots'] = shots
@@ -31,12 +41,41 @@ class BasicSimulatorConfig:
     def configure_measure_qubits(self, mqubits: List):
         self.metadata['mqubits'] = mqubits
 
+    def configure_prefix_cache(self, cache: Optional[PrefixStateCache]):
+        '''
+        With a prefix cache, the circuit may resume from the deepest cached state of its prefixes. The resumed
+        part is simulated by the numpy engine, which is slower than the native simulator, so it is only used
+        when the cache estimates that skipping the prefix saves more than the slower engine costs. Otherwise
+        the circuit runs natively, and the state where it branches from the executions before is cached in
+        Python if the next executions are estimated to gain from it. The result of a resumed run is a
+        SimulatorResult. Circuits with mid-circuit measurements always run natively.
+        '''
+        self.prefix_cache = cache
 
-class BasicSimulatorBackend:
+    def configure_branching(self, branching: bool = True, seed: Optional[int] = None):
+        '''
+        In the branching mode, the circuit is simulated once per distinct classical history, splitting at every
+        mid-circuit measurement, and the shots are sampled at the leaves. Conditions on measured clbits are supported.
+        The whole circuit, including the unitary parts between the measurements, is simulated by the numpy engine
+        instead of the native simulator, so a circuit which does not need branching runs slower in this mode.
+        '''
+        self.branching = branching
+        self.seed = seed
+
+
+class BasicSimulatorBackend(AsyncExecutionMixin):
     def __init__(self):
         self.simulator = BasicSimulator()
+        # one instance runs one execution at a time
+        self.__lock = Lock()
+
+    def assemble(self, ir: IntermediateRepresentation) -> IntermediateRepresentation:
+        '''
+        Return the executable lowered from the IR, which is cached on the IR. The IR itself is not changed.
+        '''
+        return ir.get_executable((BasicSimulatorBackend.__name__, None), self._lower)
 
-    def assemble(self, ir: IntermediateRepresentation):
+    def _lower(self, ir: IntermediateRepresentation):
         i = 0
         while i < ir.dag.vcount():
             v = ir.dag.vs[i]
@@ -71,8 +110,42 @@ class BasicSimulatorBackend:
             i += 1
 
     def execute(self, ir: IntermediateRepresentation, config: BasicSimulatorConfig):
-        self.assemble(ir)
-        return self.simulator.execute(get_graph_capsule(ir.dag), config.metadata)
+        exe = self.assemble(ir)
+        if getattr(config, 'branching', False):
+            return self._execute_branching(exe, config)
+        if getattr(config, 'prefix_cache', None) is not None:
+            return self._execute_with_prefix_cache(exe, config)
+        return self._execute_native(exe, config)
+
+    def _execute_native(self, exe: IntermediateRepresentation, config: BasicSimulatorConfig):
+        with self.__lock:
+            return self.simulator.execute(get_graph_capsule(exe.dag), config.metadata)
+
+    def _execute_with_prefix_cache(self, exe: IntermediateRepresentation, config: BasicSimulatorConfig):
+        cache = config.prefix_cache
+        qubit_num = exe.dag['qnum']
+        try:
+            ops = remove_terminal_measurements(flatten_ir(exe))
+        except ValueError:
+            return self._execute_native(exe, config)
+        keys = prefix_keys(ops, qubit_num)
+        depth, branch = cache.resume_depths(keys)
+        if cache.prefers_resume(len(ops), depth, qubit_num):
+            state = cache.simulate(ops, qubit_num, keys)
+            return SimulatorResult.from_state(state, config.metadata.get('mqubits'), config.metadata.get('shots', 1024))
+        with self.__lock:
+            begin = time.perf_counter()
+            result = self.simulator.execute(get_graph_capsule(exe.dag), config.metadata)
+            seconds = time.perf_counter() - begin
+        cache.record_native(keys, qubit_num, seconds)
+        if branch > depth and cache.prefers_resume(len(ops), branch, qubit_num):
+            # the executions before share the prefix up to branch, store its state for the next ones
+            cache.simulate(ops[:branch], qubit_num, keys[:branch + 1])
+        return result
+
+    def _execute_branching(self, exe: IntermediateRepresentation, config: BasicSimulatorConfig) -> SimulatorResult:
+        branches = simulate_branches(flatten_ir(exe), exe.dag['qnum'], exe.dag['cnum'])
+        return branching_result(branches, config.metadata.get('shots', 1024), config.metadata.get('mqubits'), config.seed)
 
     def __qubits_and_clbits(self, v):
         edges = v.in_edges()
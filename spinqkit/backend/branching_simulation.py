@@ -0,0 +1,126 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+from .statevector_util import FlatOperation, apply_matrix, operation_matrix, condition_satisfied, initial_state
+from .backend_util import marginalize_qubits
+from .sampling import sample_counts, counts_to_dict
+from .simulator_result import SimulatorResult
+
+PRUNE_EPSILON = 1e-12
+
+class Branch(object):
+    '''
+    One classical history of a simulation: its probability, the normalized state and the clbit values.
+    '''
+    __slots__ = ('weight', 'state', 'clbits')
+
+    def __init__(self, weight: float, state: np.ndarray, clbits: Tuple[int, ...]):
+        self.weight = weight
+        self.state = state
+        self.clbits = clbits
+
+def _measure(branch: Branch, qubit: int, clbit: int) -> List[Branch]:
+    state = np.moveaxis(branch.state, qubit, 0)
+    p1 = float(np.sum(np.abs(state[1]) ** 2))
+    children = []
+    for outcome, p in ((0, 1.0 - p1), (1, p1)):
+        if p <= PRUNE_EPSILON:
+            continue
+        projected = np.zeros_like(state)
+        projected[outcome] = state[outcome] / np.sqrt(p)
+        clbits = list(branch.clbits)
+        clbits[clbit] = outcome
+        children.append(Branch(branch.weight * p, np.moveaxis(projected, 0, qubit), tuple(clbits)))
+    return children
+
+def _merge(branches: List[Branch]) -> List[Branch]:
+    '''
+    Merge the branches with the same clbit values and the same state up to a global phase.
+    '''
+    groups = {}
+    for b in branches:
+        groups.setdefault(b.clbits, []).append(b)
+    merged = []
+    for group in groups.values():
+        kept = []
+        for b in group:
+            for k in kept:
+                if abs(abs(np.vdot(k.state, b.state)) - 1.0) < 1e-9:
+                    k.weight += b.weight
+                    break
+            else:
+                kept.append(b)
+        merged.extend(kept)
+    return merged
+
+def simulate_branches(ops: List[FlatOperation], qubit_num: int, clbit_num: int) -> List[Branch]:
+    '''
+    Simulate the operations once per distinct classical history. Every mid-circuit measurement splits a branch
+    into weighted outcomes with renormalized states, and the conditions are evaluated on the clbits of each branch.
+    '''
+    branches = [Branch(1.0, initial_state(qubit_num), (0,) * clbit_num)]
+    for op in ops:
+        if op.name == 'MEASURE':
+            if len(op.clbits) != len(op.qubits):
+                raise ValueError('Each measured qubit needs a clbit.')
+            for qubit, clbit in zip(op.qubits, op.clbits):
+                branches = [c for b in branches for c in _measure(b, qubit, clbit)]
+            branches = _merge(branches)
+            continue
+        mat = None
+        for b in branches:
+            if condition_satisfied(op.condition, dict(enumerate(b.clbits))):
+                if mat is None:
+                    mat = operation_matrix(op)
+                b.state = apply_matrix(b.state, mat, op.qubits)
+    return branches
+
+def _clbit_string(clbits: Tuple[int, ...]) -> str:
+    return ''.join(str(c) for c in clbits)
+
+def branching_result(branches: List[Branch], shots: int, mqubits: Optional[List[int]] = None,
+                     seed: Union[None, int, np.random.Generator] = None) -> SimulatorResult:
+    '''
+    Build the result of the branches. The shots are split over the branches by their weights,
+    and sampled from the final distribution of each branch only.
+    The counts of the clbit values, clbit 0 on the left, are kept in classical_counts.
+    '''
+    rng = np.random.default_rng(seed)
+    qubit_num = branches[0].state.ndim
+    positions = None
+    if mqubits is not None and 0 < len(set(mqubits)) < qubit_num:
+        positions = sorted(q for q in set(mqubits) if 0 <= q < qubit_num)
+
+    weights = np.array([b.weight for b in branches])
+    branch_shots = rng.multinomial(shots, weights / weights.sum())
+    probs = 0.0
+    counts = 0
+    classical_counts = {}
+    for b, n in zip(branches, branch_shots):
+        p = np.abs(np.ascontiguousarray(b.state).ravel()) ** 2
+        if positions is not None:
+            p = marginalize_qubits(p, positions)
+        probs = probs + b.weight * p
+        if n > 0:
+            counts = counts + sample_counts(p, int(n), seed=rng)
+            key = _clbit_string(b.clbits)
+            classical_counts[key] = classical_counts.get(key, 0) + int(n)
+
+    states = np.ascontiguousarray(branches[0].state).ravel() if len(branches) == 1 else None
+    count_dict = counts_to_dict(counts) if shots > 0 else {}
+    result = SimulatorResult(probs / weights.sum(), states, shots, count_dict)
+    result.classical_counts = classical_counts
+    return result
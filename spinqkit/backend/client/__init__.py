@@ -13,4 +13,5 @@
 # limitations under the License.
 
 from .spinq_cloud_client import SpinQCloudClient
-from .spinq_session import SpinQSession
\ No newline at end of file
+from .spinq_session import SpinQSession
+from .async_spinq_cloud_client import AsyncSpinQCloudClient, CloudResponse
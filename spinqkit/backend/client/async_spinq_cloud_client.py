@@ -0,0 +1,191 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, Optional
+import asyncio
+import json
+from .spinq_cloud_client import HOST, USER_URI_PREFIX, PLATFORM_URI_PREFIX, TASK_URI_PREFIX, RETRY_COUNT, encode_body
+from spinqkit.model.exceptions import SpinQCloudServerError
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+LOGIN = 'login'
+PLATFORM_LIST = 'platform_list'
+CREATE_TASK = 'create_task'
+TASK_INFO = 'task_info'
+TASK_STATUS = 'task_status'
+TASK_RESULT = 'task_result'
+
+# The number of concurrent requests to each endpoint
+DEFAULT_ENDPOINT_LIMITS = {
+    LOGIN: 1,
+    PLATFORM_LIST: 4,
+    CREATE_TASK: 32,
+    TASK_INFO: 32,
+    TASK_STATUS: 64,
+    TASK_RESULT: 32,
+}
+
+class CloudResponse(object):
+    '''
+    The status and body of a response, which is read before the connection goes back to the pool.
+    Like a requests.Response, it is True if the status code is less than 400.
+    '''
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def json(self):
+        return json.loads(self.content)
+
+class AsyncSpinQCloudClient(object):
+    '''
+    An asyncio client with the same API as SpinQCloudClient. The methods are coroutines and return CloudResponse.
+    The connections are kept alive in a pool of at most pool_size connections, and the concurrent requests
+    to each endpoint are limited by endpoint_limits. When a request gets 401, the token is refreshed once
+    for all the requests which used the expired token, and the requests are sent again.
+    The client should be closed, or used with async with, in the event loop which uses it.
+    It needs aiohttp.
+    '''
+    def __init__(self, username: str, signature: str, host: str = HOST, pool_size: int = 100,
+                 keepalive_timeout: float = 30.0, endpoint_limits: Optional[Dict[str, int]] = None,
+                 timeout: Optional[float] = 60.0):
+        if aiohttp is None:
+            raise ImportError('AsyncSpinQCloudClient needs aiohttp, which can be installed by pip install aiohttp.')
+        self.username = username
+        self.signature = signature
+        self.host = host
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        limits = dict(DEFAULT_ENDPOINT_LIMITS)
+        if endpoint_limits is not None:
+            limits.update(endpoint_limits)
+        self.endpoint_limits = limits
+        self._session = None
+        self._semaphores = {}
+        self._token = None
+        # increased by every login, to tell whether the token of a failed request is still the current one
+        self._token_generation = 0
+        self._login_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, headers={'Content-Type': 'application/json'},
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        if endpoint not in self._semaphores:
+            self._semaphores[endpoint] = asyncio.Semaphore(self.endpoint_limits.get(endpoint, self.pool_size))
+        return self._semaphores[endpoint]
+
+    async def _send(self, endpoint: str, method: str, uri: str, data: Optional[str] = None,
+                    params: Optional[Dict] = None, extra_headers: Optional[Dict] = None) -> CloudResponse:
+        headers = {} if self._token is None else {'token': self._token}
+        if extra_headers is not None:
+            headers.update(extra_headers)
+        async with self._semaphore(endpoint):
+            async with self.session.request(method, self.host + uri, data=data, params=params, headers=headers) as res:
+                return CloudResponse(res.status, await res.read())
+
+    async def _retry_request(self, endpoint: str, method: str, uri: str, data: Optional[str] = None,
+                             params: Optional[Dict] = None, retry_count: int = RETRY_COUNT,
+                             extra_headers: Optional[Dict] = None) -> CloudResponse:
+        generation = self._token_generation
+        res = await self._send(endpoint, method, uri, data, params, extra_headers)
+        while res.status_code == 401 and retry_count > 0:
+            await self._refresh_token(generation)
+            generation = self._token_generation
+            res = await self._send(endpoint, method, uri, data, params, extra_headers)
+            retry_count = retry_count - 1
+        return res
+
+    async def _refresh_token(self, stale_generation: int):
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+        async with self._login_lock:
+            # another request has logged in while this one waited
+            if self._token_generation != stale_generation:
+                return
+            await self.login()
+
+    '''
+    User API
+    '''
+
+    async def login(self):
+        userinfo = {"username": self.username, "signature": self.signature}
+        res = await self._send(LOGIN, 'POST', USER_URI_PREFIX + "/login", data=json.dumps(userinfo))
+        res_entity = res.json()
+        if res:
+            self._token = res_entity["token"]
+            self._token_generation += 1
+        else:
+            err_msg = "Authentication failed: " + res_entity["msg"] if res_entity.__contains__("msg") and res_entity["msg"] is not None else "Authentication failed"
+            raise SpinQCloudServerError(err_msg)
+
+    '''
+    Platform API
+    '''
+
+    async def retrieve_remote_platforms(self, retry_count: int = RETRY_COUNT) -> CloudResponse:
+        return await self._retry_request(PLATFORM_LIST, 'GET', PLATFORM_URI_PREFIX + "/getPlatformList", retry_count=retry_count)
+
+    '''
+    Task API
+    '''
+
+    async def create_task(self, newTask, retry_count: int = RETRY_COUNT, compress: bool = False) -> CloudResponse:
+        if not compress:
+            return await self._retry_request(CREATE_TASK, 'POST', TASK_URI_PREFIX + "/create", data=json.dumps(newTask),
+                                             retry_count=retry_count)
+        body, headers = encode_body(newTask, True)
+        return await self._retry_request(CREATE_TASK, 'POST', TASK_URI_PREFIX + "/create", data=body,
+                                         retry_count=retry_count, extra_headers=headers)
+
+    async def get_task_by_code(self, task_code: str, retry_count: int = RETRY_COUNT) -> CloudResponse:
+        return await self._retry_request(TASK_INFO, 'GET', TASK_URI_PREFIX + "/retrieveTaskInfoByTcode",
+                                         params={"taskCode": task_code}, retry_count=retry_count)
+
+    async def task_status(self, task_code: str, retry_count: int = RETRY_COUNT) -> CloudResponse:
+        return await self._retry_request(TASK_STATUS, 'GET', TASK_URI_PREFIX + "/retrieveCurrentTaskStatus",
+                                         params={"taskCode": task_code}, retry_count=retry_count)
+
+    async def task_result(self, task_code: str, retry_count: int = RETRY_COUNT) -> CloudResponse:
+        return await self._retry_request(TASK_RESULT, 'GET', TASK_URI_PREFIX + "/getTaskRunResultByTcode",
+                                         params={"taskCode": task_code}, retry_count=retry_count)
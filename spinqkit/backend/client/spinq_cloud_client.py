@@ -13,8 +13,15 @@
 # limitations under the License.
 
 from .spinq_session import SpinQSession
+from spinqkit.model.exceptions import SpinQCloudServerError
+import gzip
 import json
-from typing import Optional
+from typing import Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 HOST = "http://cloud.spinq.cn:6060"
 
@@ -23,22 +30,64 @@ PLATFORM_URI_PREFIX = "/platform/spinqkit"
 TASK_URI_PREFIX = "/task/user"
 RETRY_COUNT = 3
 
+def encode_body(obj, compress: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    '''
+    Serialize a request body as compact JSON, by orjson if it is installed, and gzip it if compress is True.
+    Return the body and the headers it needs.
+    '''
+    body = None
+    if orjson is not None:
+        try:
+            body = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # a type orjson does not know, e.g. a subclass of float
+            body = None
+    if body is None:
+        body = json.dumps(obj, separators=(',', ':')).encode()
+    headers = {}
+    if compress:
+        # higher levels cost several times the CPU for a few percent on these payloads
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
 class SpinQCloudClient():
 
-    def __init__(self, username, signature, session: Optional[SpinQSession] = None):
+    def __init__(self, username, signature, session: Optional[SpinQSession] = None, host: str = HOST):
         """SipinQCloudClient constructor"""
         self.username = username
         self.signature = signature
+        self.host = host
         self._session = session if session is not None else SpinQSession()
+        self._authenticator = None
 
     @property
     def session(self):
         return self._session
 
+    @property
+    def token(self) -> Optional[str]:
+        return self._session.headers.get("token")
+
+    def set_token(self, token: str):
+        self._session.setHeader("token", token)
+
+    def set_authenticator(self, authenticator):
+        '''
+        When a request gets 401, authenticator(client, stale_token) is called instead of login to give the client
+        a valid token, so the clients of one account can share their tokens.
+        '''
+        self._authenticator = authenticator
+
     def _retry_request(self, rquest_func, retry_count, *args):
+        token = self.token
         res = rquest_func(*args)
         while res.status_code == 401 and retry_count > 0:
-            self.login()
+            if self._authenticator is None:
+                self.login()
+            else:
+                self._authenticator(self, token)
+            token = self.token
             print("Access token timeout. Automatically refreshed identity.")
             res = rquest_func(*args)
             retry_count = retry_count - 1
@@ -50,48 +99,58 @@ class SpinQCloudClient():
 
     def login(self):
         userinfo = {"username": self.username, "signature": self.signature}
-        res = self._session.post(HOST + USER_URI_PREFIX + "/login", data=json.dumps(userinfo))
+        res = self._session.post(self.host + USER_URI_PREFIX + "/login", data=json.dumps(userinfo))
         res_entity = json.loads(res.content)
         if res:
             access_token = res_entity["token"]
             self.session.setHeader("token", access_token)
+            return access_token
         else:
             err_msg = "Authentication failed: " + res_entity["msg"] if res_entity.__contains__("msg") and res_entity["msg"] is not None else "Authentication failed"
-            raise Exception(err_msg)
+            raise SpinQCloudServerError(err_msg)
 
     '''
     Platform API
     '''
 
-    def retrieve_remote_platforms(self):
-        return self._session.get(HOST + PLATFORM_URI_PREFIX + "/getPlatformList")
+    def _retrieve_remote_platforms(self):
+        return self._session.get(self.host + PLATFORM_URI_PREFIX + "/getPlatformList")
+
+    def retrieve_remote_platforms(self, retry_count:int = RETRY_COUNT):
+        return self._retry_request(self._retrieve_remote_platforms, retry_count)
 
     '''
     Task API
     '''
-    def _create_task(self, newTask):
-        return self._session.post(HOST + TASK_URI_PREFIX + "/create", data=json.dumps(newTask))
-
-    def create_task(self, newTask, retry_count:int = RETRY_COUNT):
-        return self._retry_request(self._create_task, retry_count, newTask)
+    def _create_task(self, newTask, compress: bool = False):
+        if not compress:
+            return self._session.post(self.host + TASK_URI_PREFIX + "/create", data=json.dumps(newTask))
+        body, headers = encode_body(newTask, True)
+        return self._session.post(self.host + TASK_URI_PREFIX + "/create", data=body, headers=headers)
+
+    def create_task(self, newTask, retry_count:int = RETRY_COUNT, compress: bool = False):
+        '''
+        With compress, the body is sent as gzipped compact JSON.
+        '''
+        return self._retry_request(self._create_task, retry_count, newTask, compress)
 
     def _get_task_by_code(self, task_code: str):
         taskinfo = {"taskCode": task_code}
-        return self._session.get(HOST + TASK_URI_PREFIX + "/retrieveTaskInfoByTcode", params=taskinfo)
+        return self._session.get(self.host + TASK_URI_PREFIX + "/retrieveTaskInfoByTcode", params=taskinfo)
 
     def get_task_by_code(self, task_code: str, retry_count:int = RETRY_COUNT):
         return self._retry_request(self._get_task_by_code, retry_count, task_code)
 
     def _task_status(self, task_code: str):
         taskinfo = {"taskCode": task_code}
-        return self._session.get(HOST + TASK_URI_PREFIX + "/retrieveCurrentTaskStatus", params=taskinfo)
+        return self._session.get(self.host + TASK_URI_PREFIX + "/retrieveCurrentTaskStatus", params=taskinfo)
 
     def task_status(self, task_code: str, retry_count:int = RETRY_COUNT):
         return self._retry_request(self._task_status, retry_count, task_code)
 
     def _task_result(self, task_code: str):
         taskinfo = {"taskCode": task_code}
-        return self._session.get(HOST + TASK_URI_PREFIX + "/getTaskRunResultByTcode", params=taskinfo)
+        return self._session.get(self.host + TASK_URI_PREFIX + "/getTaskRunResultByTcode", params=taskinfo)
 
     def task_result(self, task_code: str, retry_count:int = RETRY_COUNT):
         return self._retry_request(self._task_result, retry_count, task_code)
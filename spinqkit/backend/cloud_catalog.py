@@ -0,0 +1,176 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Callable, List, Optional
+from threading import Event, Lock, RLock, Thread
+import time
+from spinqkit.model.spinqCloud.platform import Platform
+from .client.spinq_cloud_client import SpinQCloudClient
+
+DEFAULT_PLATFORM_TTL = 300.0
+DEFAULT_TOKEN_TTL = 1800.0
+DEFAULT_MIN_REFRESH_INTERVAL = 10.0
+
+class _Account(object):
+    __slots__ = ('lock', 'signature', 'token', 'token_time', 'platforms', 'platforms_time', 'used', 'client', 'fetch')
+
+    def __init__(self):
+        self.lock = RLock()
+        self.signature = None
+        self.token = None
+        self.token_time = 0.0
+        self.platforms = None
+        self.platforms_time = 0.0
+        self.used = False
+        self.client = None
+        self.fetch = None
+
+class CloudCatalog(object):
+    '''
+    Cache the login token and the platform list of each cloud account, keyed by the host and the username,
+    so the backends of one account log in and fetch the platforms once. A token is reused for token_ttl seconds,
+    or until a request gets 401, when one client logs in again for all of them. A platform list is reused for
+    platform_ttl seconds. With background_refresh, a daemon thread fetches again the platform lists which have
+    been read since their last fetch, before they expire.
+    '''
+    def __init__(self, platform_ttl: float = DEFAULT_PLATFORM_TTL, token_ttl: float = DEFAULT_TOKEN_TTL,
+                 min_refresh_interval: float = DEFAULT_MIN_REFRESH_INTERVAL, background_refresh: bool = True):
+        self.platform_ttl = platform_ttl
+        self.token_ttl = token_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.background_refresh = background_refresh
+        self.__lock = Lock()
+        self.__accounts = {}
+        self.__stop = Event()
+        self.__thread = None
+
+    def _account(self, client: SpinQCloudClient) -> _Account:
+        with self.__lock:
+            key = (client.host, client.username)
+            if key not in self.__accounts:
+                self.__accounts[key] = _Account()
+            return self.__accounts[key]
+
+    def login(self, client: SpinQCloudClient):
+        '''
+        Give the client the token of its account if the token is fresh, otherwise log in.
+        The client then asks the catalog for a new token when its token expires.
+        '''
+        account = self._account(client)
+        with account.lock:
+            if account.token is not None and account.signature == client.signature \
+                    and time.monotonic() - account.token_time < self.token_ttl:
+                client.set_token(account.token)
+            else:
+                self._login(account, client)
+        client.set_authenticator(self._authenticate)
+
+    def _login(self, account: _Account, client: SpinQCloudClient):
+        token = client.login()
+        account.signature = client.signature
+        account.token = token
+        account.token_time = time.monotonic()
+
+    def _authenticate(self, client: SpinQCloudClient, stale_token: Optional[str]):
+        account = self._account(client)
+        with account.lock:
+            # another client of the account has logged in since the request was sent
+            if account.token is not None and account.token != stale_token and account.signature == client.signature:
+                client.set_token(account.token)
+            else:
+                self._login(account, client)
+
+    def platforms(self, client: SpinQCloudClient, fetch: Callable[[SpinQCloudClient], List[Platform]],
+                  max_age: Optional[float] = None) -> List[Platform]:
+        '''
+        Return the platform list of the account of client, fetched by fetch(client) if the cached list
+        is older than max_age seconds, platform_ttl by default.
+        '''
+        max_age = self.platform_ttl if max_age is None else max_age
+        account = self._account(client)
+        with account.lock:
+            account.client = client
+            account.fetch = fetch
+            account.used = True
+            if account.platforms is None or time.monotonic() - account.platforms_time >= max_age:
+                self._fetch(account)
+            platforms = account.platforms
+        self._start_refresher()
+        return list(platforms)
+
+    def _fetch(self, account: _Account):
+        platforms = account.fetch(account.client)
+        account.platforms = platforms
+        account.platforms_time = time.monotonic()
+        account.used = False
+
+    def invalidate(self, username: Optional[str] = None, host: Optional[str] = None):
+        '''
+        Drop the tokens and the platform lists of the accounts with username and host, all the accounts if both are None.
+        '''
+        with self.__lock:
+            for key in list(self.__accounts.keys()):
+                if (host is None or key[0] == host) and (username is None or key[1] == username):
+                    del self.__accounts[key]
+
+    def close(self):
+        '''
+        Stop the background refresh.
+        '''
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def _start_refresher(self):
+        if not self.background_refresh or self.__stop.is_set():
+            return
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = Thread(target=self._run, name='CloudCatalog', daemon=True)
+                self.__thread.start()
+
+    def _run(self):
+        interval = max(self.platform_ttl / 4, 0.01)
+        while not self.__stop.wait(interval):
+            with self.__lock:
+                accounts = list(self.__accounts.values())
+            for account in accounts:
+                with account.lock:
+                    if not account.used or account.platforms is None \
+                            or time.monotonic() - account.platforms_time < self.platform_ttl / 2:
+                        continue
+                    client, fetch = account.client, account.fetch
+                # the readers keep the cached list while it is fetched
+                try:
+                    platforms = fetch(client)
+                except Exception:
+                    # the next read fetches it again once it expires
+                    continue
+                with account.lock:
+                    account.platforms = platforms
+                    account.platforms_time = time.monotonic()
+                    account.used = False
+
+_shared_catalog = None
+_shared_catalog_lock = Lock()
+
+def shared_catalog() -> CloudCatalog:
+    '''
+    The catalog used by the cloud backends by default.
+    '''
+    global _shared_catalog
+    with _shared_catalog_lock:
+        if _shared_catalog is None:
+            _shared_catalog = CloudCatalog()
+        return _shared_catalog
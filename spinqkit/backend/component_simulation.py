@@ -0,0 +1,87 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List
+import numpy as np
+from .statevector_util import FlatOperation, simulate_operations
+from .backend_util import permute_qubits
+
+def qubit_components(ops: List[FlatOperation], qubit_num: int) -> List[List[int]]:
+    '''
+    Group the qubits which are connected by multi-qubit gates, ordered by their smallest qubit.
+    A qubit without any multi-qubit gate is a component by itself.
+    '''
+    parent = list(range(qubit_num))
+
+    def find(q):
+        while parent[q] != q:
+            parent[q] = parent[parent[q]]
+            q = parent[q]
+        return q
+
+    for op in ops:
+        if op.name == 'MEASURE':
+            continue
+        roots = [find(q) for q in op.qubits]
+        for r in roots[1:]:
+            parent[find(r)] = find(roots[0])
+    groups = {}
+    for q in range(qubit_num):
+        groups.setdefault(find(q), []).append(q)
+    return sorted(groups.values(), key=lambda g: g[0])
+
+def simulate_component_states(ops: List[FlatOperation], components: List[List[int]]) -> List[np.ndarray]:
+    '''
+    Simulate each component on its own state, with its qubits in the order of the component.
+    The operations should be unitary.
+    '''
+    component_of = {}
+    for c, qubits in enumerate(components):
+        for local, q in enumerate(qubits):
+            component_of[q] = (c, local)
+    component_ops = [[] for _ in components]
+    for op in ops:
+        c = component_of[op.qubits[0]][0]
+        local_qubits = [component_of[q][1] for q in op.qubits]
+        component_ops[c].append(FlatOperation(op.name, local_qubits, op.params, op.clbits, op.condition,
+                                              op.matrix, op.ctrl_num, op.inverse))
+    return [simulate_operations(sub_ops, len(qubits)) for qubits, sub_ops in zip(components, component_ops)]
+
+def _outer_product(arrays: List[np.ndarray], components: List[List[int]]) -> np.ndarray:
+    product = np.ones(())
+    order = []
+    for qubits, array in zip(components, arrays):
+        product = np.multiply.outer(product, array)
+        order.extend(qubits)
+    # qubit q of the outer product is at position order.index(q)
+    return permute_qubits(product.reshape(-1), np.argsort(order).tolist())
+
+def combine_probabilities(states: List[np.ndarray], components: List[List[int]]) -> np.ndarray:
+    '''
+    The probabilities of the whole circuit, the outer product of the component probabilities.
+    '''
+    return _outer_product([np.abs(state) ** 2 for state in states], components)
+
+def combine_states(states: List[np.ndarray], components: List[List[int]]) -> np.ndarray:
+    '''
+    The state of the whole circuit, the tensor product of the component states. It takes 2^n amplitudes.
+    '''
+    return _outer_product([np.asarray(state, dtype=complex) for state in states], components)
+
+def simulate_components(ops: List[FlatOperation], qubit_num: int, components: List[List[int]]) -> np.ndarray:
+    '''
+    Simulate each component on its own state and return the probabilities of the whole circuit,
+    the outer product of the component probabilities. The operations should be unitary.
+    '''
+    return combine_probabilities(simulate_component_states(ops, components), components)
@@ -15,5 +15,6 @@
 from .layout import Layout
 from .layout_util import collect_gate_qubits
 from .physical_layout import generate_direct_layout
+from .subgraph_layout import generate_subgraph_layout
 from .routing_layout import generate_routing_layout
 from .sven_swap_mapper import generate_lookahead_routing
\ No newline at end of file
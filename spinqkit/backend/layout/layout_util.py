@@ -16,39 +16,40 @@ from typing import List, Tuple, Set
 from igraph import Vertex
 from spinqkit.compiler import IntermediateRepresentation, NodeType
 import pdb
-from spinqkit.model.spinqCloud.circuit import topological_sort_by_dfs
+from spinqkit.compiler.ir import main_thread_order, definition_orders
 
 def _visit_caller_node(ir: IntermediateRepresentation, caller: Vertex, qubits: List) -> List[Tuple]:
-    def_node = ir.dag.vs.find(caller['name'], type=NodeType.definition.value)
+    orders = definition_orders(ir)
     connections = []
-    
-    vs = topological_sort_by_dfs([def_node.index], ir.dag)
-    for vidx in vs:
-        if vidx != def_node.index:
+
+    # the callers being expanded, with their index path, qubits and the rest of their callees
+    stack = [((caller.index,), qubits, iter(orders[caller['name']]))]
+    while len(stack) > 0:
+        ids, qubits, callees = stack[-1]
+        for vidx in callees:
             node = ir.dag.vs[vidx]
             qidxes = node['qubits']
             local = [qubits[i] for i in qidxes]
-            
+
             if node['type'] == NodeType.callee.value:
-                if len(node['qubits']) >= 2:
+                if len(qidxes) >= 2:
                     pairs = [(local[i], local[j]) for i in range(len(local)) for j in range(i+1, len(local))]
                     for pair in pairs:
-                        connections.append(((caller.index, node.index), pair))
+                        connections.append((ids + (vidx,), pair))
                 else:
-                    connections.append(((caller.index, node.index), tuple(local)))
+                    connections.append((ids + (vidx,), tuple(local)))
             elif node['type'] == NodeType.caller.value:
-                recurs = _visit_caller_node(ir, node, local)
-                for ids, pair in recurs:
-                    connections.append(((caller.index,)+ids, pair))            
-    
+                stack.append((ids + (vidx,), local, iter(orders[node['name']])))
+                break
+        else:
+            stack.pop()
+
     return connections
 
 def collect_gate_qubits(ir: IntermediateRepresentation) -> List[Tuple]:
     gates = []
 
-    registers = ir.dag.vs.select(type = NodeType.register.value)
-    reg_indices = [node.index for node in registers]
-    vidx_list = topological_sort_by_dfs(reg_indices, ir.dag)
+    vidx_list = main_thread_order(ir)
     
     for idx in vidx_list:
         v = ir.dag.vs[idx]
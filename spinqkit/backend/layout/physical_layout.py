@@ -16,6 +16,7 @@ from typing import List, Tuple
 from time import time
 from constraint import RecursiveBacktrackingSolver, Problem, AllDifferentConstraint
 from spinqkit.model import InappropriateBackendError
+from .subgraph_layout import generate_subgraph_layout, DEFAULT_TIME_BUDGET
 
 class CSPSolver(RecursiveBacktrackingSolver):
     def __init__(self, iteration_limit: int = None, timeout: float = None):
@@ -50,12 +51,19 @@ class CSPSolver(RecursiveBacktrackingSolver):
         return super().recursiveBacktracking(solutions, domains, vconstraints, assignments, single)
     
 
-def generate_direct_layout(logical_qubit_num: int, logical_connections: List[Tuple], physical_qubit_num: int, coupling_map: List[Tuple], iteration_limit: int = 1000, timeout: float = None) -> Tuple[Layout, str]:
+def generate_direct_layout(logical_qubit_num: int, logical_connections: List[Tuple], physical_qubit_num: int, coupling_map: List[Tuple], iteration_limit: int = 1000, timeout: float = None, method: str = 'subgraph') -> Tuple[Layout, str]:
     '''Each tuple in logical_connections may have 2 or 3 qubits.
+       The layout is searched by generate_subgraph_layout within timeout seconds, or by the constraint solver
+       within iteration_limit and timeout if method is 'csp'. Return None and the reason if no layout is found.
     '''
     if logical_qubit_num > physical_qubit_num:
         raise InappropriateBackendError('There is no enough qubits.')
 
+    if method == 'subgraph':
+        layout, perfect, mesg = generate_subgraph_layout(logical_qubit_num, logical_connections, physical_qubit_num,
+                                                         coupling_map, timeout if timeout is not None else DEFAULT_TIME_BUDGET)
+        return (layout, mesg) if perfect else (None, mesg)
+
     solver = CSPSolver(iteration_limit, timeout)
     problem = Problem(solver)
     logical_qubits = list(range(logical_qubit_num))
@@ -0,0 +1,151 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Dict, List, Optional, Tuple
+from igraph import Graph
+from math import inf
+from time import time
+from spinqkit.model import InappropriateBackendError
+from .layout import Layout
+
+DEFAULT_TIME_BUDGET = 1.0
+
+def interaction_graph(logical_qubit_num: int, logical_connections: List[Tuple]) -> Graph:
+    '''
+    The undirected graph of the logical qubits, with an edge for each pair of qubits which share gates,
+    weighted by the number of such gates. A 3-qubit gate connects each of its pairs.
+    '''
+    weights = {}
+    for qubits in logical_connections:
+        for i in range(len(qubits)):
+            for j in range(i+1, len(qubits)):
+                pair = (min(qubits[i], qubits[j]), max(qubits[i], qubits[j]))
+                weights[pair] = weights.get(pair, 0) + 1
+    pairs = list(weights.keys())
+    graph = Graph(n=logical_qubit_num, edges=pairs)
+    graph.es['weight'] = [weights[p] for p in pairs]
+    return graph
+
+def coupling_graph(physical_qubit_num: int, coupling_map: List[Tuple]) -> Graph:
+    graph = Graph(n=physical_qubit_num, edges=[tuple(c) for c in coupling_map])
+    graph.simplify()
+    return graph
+
+def layout_cost(log_to_phy: Dict, interactions: Graph, physical: Graph) -> float:
+    '''
+    The sum of the interaction weights times the distances between the physical qubits. The distances are
+    measured on the coupling graph between the used physical qubits, which the routing can swap through,
+    and the cost is inf if two interacting qubits are not connected there.
+    '''
+    occupied = sorted(log_to_phy.values())
+    position = {p: i for i, p in enumerate(occupied)}
+    distances = physical.induced_subgraph(occupied).distances()
+    total = 0
+    for e in interactions.es:
+        d = distances[position[log_to_phy[e.source]]][position[log_to_phy[e.target]]]
+        if d == inf:
+            return inf
+        total += e['weight'] * d
+    return total
+
+def _find_embedding(pattern: Graph, physical: Graph, deadline: float) -> Tuple[Optional[List[int]], bool]:
+    '''
+    Return the physical qubit of each pattern vertex, or None, and whether the search finished in time.
+    '''
+    pattern_degrees = pattern.degree()
+    physical_degrees = physical.degree()
+    timed_out = [False]
+
+    def compatible(physical, pattern, p, l):
+        # prune by degree, and everything once the time is up
+        if timed_out[0] or time() >= deadline:
+            timed_out[0] = True
+            return False
+        return physical_degrees[p] >= pattern_degrees[l]
+
+    # VF2 here matches subgraphs which are not necessarily induced
+    found, _, mapping = physical.subisomorphic_vf2(pattern, return_mapping_21=True, node_compat_fn=compatible)
+    if timed_out[0]:
+        return None, False
+    return (mapping if found else None), True
+
+def _improve(log_to_phy: Dict, interactions: Graph, physical: Graph, deadline: float) -> Tuple[Dict, float]:
+    # move one logical qubit at a time to another physical qubit, swapping with the qubit there, while the cost decreases
+    best = dict(log_to_phy)
+    best_cost = layout_cost(best, interactions, physical)
+    improved = True
+    while improved and best_cost > 0 and time() < deadline:
+        improved = False
+        phy_to_log = {p: l for l, p in best.items()}
+        for l in range(interactions.vcount()):
+            for p in range(physical.vcount()):
+                if p == best[l]:
+                    continue
+                candidate = dict(best)
+                if p in phy_to_log:
+                    candidate[phy_to_log[p]] = best[l]
+                candidate[l] = p
+                cost = layout_cost(candidate, interactions, physical)
+                if cost < best_cost:
+                    best, best_cost = candidate, cost
+                    improved = True
+                    break
+            if improved or time() >= deadline:
+                break
+    return best, best_cost
+
+def generate_subgraph_layout(logical_qubit_num: int, logical_connections: List[Tuple], physical_qubit_num: int,
+                             coupling_map: Optional[List[Tuple]], timeout: Optional[float] = DEFAULT_TIME_BUDGET) -> Tuple[Layout, bool, str]:
+    '''
+    Embed the interaction graph of the logical qubits into the coupling graph by subgraph isomorphism (VF2).
+    Return the layout, whether every interacting pair is coupled, and a message. When there is no such embedding,
+    or none is found in timeout seconds, the layout is the one with the least layout_cost among the embeddings
+    of the heaviest interactions, the trivial layout, and their local improvements.
+    '''
+    if logical_qubit_num > physical_qubit_num:
+        raise InappropriateBackendError('There is no enough qubits.')
+    deadline = time() + (timeout if timeout is not None else DEFAULT_TIME_BUDGET)
+    layout = Layout()
+    if coupling_map is None:
+        # all the qubits are coupled
+        for k in range(logical_qubit_num):
+            layout.add_log_to_phy(k, k)
+        return layout, True, 'OK'
+
+    interactions = interaction_graph(logical_qubit_num, logical_connections)
+    physical = coupling_graph(physical_qubit_num, coupling_map)
+    mapping, finished = _find_embedding(interactions, physical, deadline)
+    if mapping is not None:
+        for k in range(logical_qubit_num):
+            layout.add_log_to_phy(k, mapping[k])
+        return layout, True, 'OK'
+
+    candidates = [{k: k for k in range(logical_qubit_num)}]
+    # drop the lightest interactions until the rest can be embedded
+    pattern = interactions.copy()
+    while pattern.ecount() > 0 and time() < deadline:
+        pattern.delete_edges([min(range(pattern.ecount()), key=lambda e: pattern.es[e]['weight'])])
+        mapping, _ = _find_embedding(pattern, physical, deadline)
+        if mapping is not None:
+            candidates.append({k: mapping[k] for k in range(logical_qubit_num)})
+            break
+
+    best, best_cost = None, inf
+    for candidate in candidates:
+        improved, cost = _improve(candidate, interactions, physical, deadline)
+        if best is None or cost < best_cost:
+            best, best_cost = improved, cost
+    for k in range(logical_qubit_num):
+        layout.add_log_to_phy(k, best[k])
+    message = 'There is no available layout.' if finished else 'Layout execution timeout.'
+    return layout, False, message
@@ -172,6 +172,8 @@ def _search_best_swap(gates: List, physical_edges: List, mapping: Layout, dist_m
     logical_swap = [mapping.phy_to_log[q] for q in best_swap]
    
     swap_pos = _locate_swap(logical_swap, gates)
+    if swap_pos is None:
+        raise RoutingError('The swap gate cannot be placed before any remaining gate')
     if swap_pos in swap_gates:
         swap_gates[swap_pos].insert(0, best_swap)
     else:
@@ -204,7 +206,10 @@ def generate_lookahead_routing(gates: List[Tuple], topology: List[Tuple], mappin
         if prev_remaining == len(gates_remaining):
             raise RoutingError('Some multi-qubit gates cannot be handled')
         prev_remaining = len(gates_remaining)
-        swaps_added, gates_remaining, gates_mapped = _search_best_swap(gates_remaining, coupling_map, mapping, dist_matrix, search_depth, search_width)
+        step = _search_best_swap(gates_remaining, coupling_map, mapping, dist_matrix, search_depth, search_width)
+        if step is None:
+            raise RoutingError('Some multi-qubit gates cannot be handled')
+        swaps_added, gates_remaining, gates_mapped = step
 
         swap_phy_qubits = []
         sorted_keys = sorted(swaps_added.keys())
@@ -0,0 +1,215 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import heapq
+import itertools
+import time
+import numpy as np
+from .statevector_util import FlatOperation, apply_matrix, operation_matrix, condition_satisfied, initial_state
+
+DEFAULT_CHECKPOINT_INTERVAL = 16
+DEFAULT_MAX_PREFIXES = 1 << 16
+# the assumed time of the Python engine over the native simulator until both are measured
+DEFAULT_PYTHON_SLOWDOWN = 4.0
+# the weight of a new measurement in the running averages of the engine speeds
+RATE_SMOOTHING = 0.3
+
+def _operation_key(op: FlatOperation) -> bytes:
+    key = repr((op.name, op.qubits, [float(p) for p in op.params], op.condition, op.ctrl_num, op.inverse)).encode()
+    if op.matrix is not None:
+        key += np.ascontiguousarray(op.matrix, dtype=complex).tobytes()
+    return key
+
+def prefix_keys(ops: List[FlatOperation], qubit_num: int) -> List[bytes]:
+    '''
+    keys[k] is a structural hash of the first k operations with their bound parameters.
+    '''
+    h = hashlib.blake2b(str(qubit_num).encode(), digest_size=16)
+    keys = [h.digest()]
+    for op in ops:
+        h.update(_operation_key(op))
+        keys.append(h.digest())
+    return keys
+
+class PrefixStateCache(object):
+    '''
+    Cache the intermediate states of simulations by the hash of the operations before them,
+    so executions sharing a prefix only simulate their different suffixes.
+    A state is stored every checkpoint_interval operations, at the end, and where the operations leave
+    the deepest prefix executed before, which is where the next executions are likely to branch again.
+    When the stored states exceed memory_budget bytes, the states resumed from the fewest times are evicted,
+    the deepest of them first, so the shared prefixes outlive the suffixes of single executions.
+    The hashes of up to max_prefixes executed prefixes are kept to find the branch points.
+    The states are simulated by the numpy engine, which is slower than the native simulator. The cache
+    keeps the measured time per operation of both engines for each number of qubits, and the basic simulator
+    backend only resumes from a cached state when that is estimated to be faster than a native run.
+    One cache can be shared by several configs and threads.
+    '''
+    def __init__(self, memory_budget: int = 256 << 20, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+                 max_prefixes: int = DEFAULT_MAX_PREFIXES):
+        self.__budget = memory_budget
+        self.__interval = max(1, checkpoint_interval)
+        self.__max_prefixes = max_prefixes
+        # key -> [state, depth, hits, order]
+        self.__states = {}
+        self.__heap = []
+        self.__order = itertools.count()
+        self.__prefixes = OrderedDict()
+        self.__memory = 0
+        self.__lock = Lock()
+        # qubit number -> seconds per operation
+        self.__python_rates = {}
+        self.__native_rates = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def memory_usage(self) -> int:
+        return self.__memory
+
+    def __len__(self) -> int:
+        return len(self.__states)
+
+    def __deepcopy__(self, memo):
+        # a copied config shares the cache
+        return self
+
+    def clear(self):
+        with self.__lock:
+            self.__states.clear()
+            self.__heap.clear()
+            self.__prefixes.clear()
+            self.__memory = 0
+
+    def _push(self, key: bytes, entry: List):
+        # the entries in the heap are stale once the hits of the state change, they are skipped when popped
+        heapq.heappush(self.__heap, (entry[2], -entry[1], entry[3], key))
+        if len(self.__heap) > 2 * len(self.__states) + 64:
+            self.__heap = [(e[2], -e[1], e[3], k) for k, e in self.__states.items()]
+            heapq.heapify(self.__heap)
+
+    def resume_depths(self, keys: List[bytes]) -> Tuple[int, int]:
+        '''
+        Return the depth of the deepest cached prefix and the depth of the deepest prefix executed before.
+        '''
+        with self.__lock:
+            return self._deepest(keys, self.__states), self._deepest(keys, self.__prefixes)
+
+    @staticmethod
+    def _deepest(keys: List[bytes], table) -> int:
+        for k in range(len(keys) - 1, 0, -1):
+            if keys[k] in table:
+                return k
+        return 0
+
+    def _measure(self, rates: dict, qubit_num: int, op_num: int, seconds: float):
+        if op_num <= 0:
+            return
+        rate = seconds / op_num
+        with self.__lock:
+            old = rates.get(qubit_num)
+            rates[qubit_num] = rate if old is None else (1 - RATE_SMOOTHING) * old + RATE_SMOOTHING * rate
+
+    def record_native(self, keys: List[bytes], qubit_num: int, seconds: float):
+        '''
+        Record a native run of the operations with the prefix keys, which took seconds.
+        '''
+        self._measure(self.__native_rates, qubit_num, len(keys) - 1, seconds)
+        self._record(keys)
+
+    def prefers_resume(self, op_num: int, depth: int, qubit_num: int) -> bool:
+        '''
+        Whether simulating the last op_num - depth operations in Python is estimated to be faster than
+        running all the op_num operations natively. It is False until a native run has been measured.
+        '''
+        with self.__lock:
+            native = self.__native_rates.get(qubit_num)
+            python = self.__python_rates.get(qubit_num)
+        if native is None or depth <= 0:
+            return False
+        if python is None:
+            python = DEFAULT_PYTHON_SLOWDOWN * native
+        return (op_num - depth) * python < op_num * native
+
+    def _lookup(self, keys: List[bytes]):
+        '''
+        Return the depth and the state of the deepest cached prefix, and the depth of the deepest prefix executed before.
+        '''
+        with self.__lock:
+            branch = self._deepest(keys, self.__prefixes)
+            for k in range(len(keys) - 1, 0, -1):
+                entry = self.__states.get(keys[k])
+                if entry is not None:
+                    entry[2] += 1
+                    self._push(keys[k], entry)
+                    self.hits += 1
+                    return k, entry[0], branch
+            self.misses += 1
+        return 0, None, branch
+
+    def _record(self, keys: List[bytes]):
+        with self.__lock:
+            for key in keys[1:]:
+                self.__prefixes[key] = None
+                self.__prefixes.move_to_end(key)
+            while len(self.__prefixes) > self.__max_prefixes:
+                self.__prefixes.popitem(last=False)
+
+    def _store(self, key: bytes, depth: int, state: np.ndarray):
+        if state.nbytes > self.__budget:
+            return
+        state.flags.writeable = False
+        with self.__lock:
+            if key in self.__states:
+                return
+            entry = [state, depth, 0, next(self.__order)]
+            self.__states[key] = entry
+            self._push(key, entry)
+            self.__memory += state.nbytes
+            while self.__memory > self.__budget:
+                hits, _, order, old_key = heapq.heappop(self.__heap)
+                old = self.__states.get(old_key)
+                if old is None or old[2] != hits or old[3] != order:
+                    continue
+                del self.__states[old_key]
+                self.__memory -= old[0].nbytes
+
+    def simulate(self, ops: List[FlatOperation], qubit_num: int, keys: Optional[List[bytes]] = None) -> np.ndarray:
+        '''
+        Return the final state tensor, resuming from the deepest cached prefix.
+        Conditions are evaluated with all the clbits equal to 0. The returned state is read-only.
+        keys are the prefix_keys of the operations if they are already calculated.
+        '''
+        if keys is None:
+            keys = prefix_keys(ops, qubit_num)
+        start, state, branch = self._lookup(keys)
+        if state is None:
+            state = initial_state(qubit_num)
+        begin = time.perf_counter()
+        for k in range(start, len(ops)):
+            op = ops[k]
+            if op.name == 'MEASURE':
+                raise ValueError('Measurements cannot be simulated on a state vector.')
+            if condition_satisfied(op.condition, {}):
+                state = apply_matrix(state, operation_matrix(op), op.qubits)
+            if (k + 1) % self.__interval == 0 or k + 1 == branch or k + 1 == len(ops):
+                state = np.ascontiguousarray(state)
+                self._store(keys[k + 1], k + 1, state)
+        self._measure(self.__python_rates, qubit_num, len(ops) - start, time.perf_counter() - begin)
+        self._record(keys)
+        return state
@@ -0,0 +1,92 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Optional, Tuple
+from threading import Lock
+import hashlib
+import json
+import sqlite3
+import time
+from spinqkit.model.spinqCloud.task import Task
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+def task_key(task: Task) -> str:
+    '''
+    The hash of what decides the result of a task: the transpiled circuit, the platform, the shots,
+    calc_matrix and the active physical qubits.
+    '''
+    content = {
+        "circuit": task.circuit.to_dict(),
+        "platformCode": task.platform_code,
+        "shots": task.shots,
+        "calcMatrix": task.calc_matrix,
+        "activeBits": task.active_bits,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+class ResultCache(object):
+    '''
+    Store the run results of cloud tasks by the content of the tasks, so an identical task is not run again.
+    The results are kept in a sqlite database at path, in memory if path is None, and expire after ttl seconds.
+    One cache can be shared by several backends and threads.
+    '''
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = DEFAULT_TTL):
+        self.path = path if path is not None else ':memory:'
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.__lock = Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__conn:
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, task_code TEXT, run TEXT, created REAL)')
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        '''
+        Return the task code and the run result stored for key, or None if there is none or it expired.
+        '''
+        with self.__lock:
+            row = self.__conn.execute('SELECT task_code, run, created FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[2] > self.ttl:
+                with self.__conn:
+                    self.__conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, task_code: str, run: dict):
+        with self.__lock, self.__conn:
+            self.__conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                (key, task_code, json.dumps(run), time.time()))
+
+    def purge_expired(self):
+        if self.ttl is None:
+            return
+        with self.__lock, self.__conn:
+            self.__conn.execute('DELETE FROM results WHERE created < ?', (time.time() - self.ttl,))
+
+    def clear(self):
+        with self.__lock, self.__conn:
+            self.__conn.execute('DELETE FROM results')
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,81 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+from .backend_util import marginalize_qubits
+
+def probabilities_to_array(probabilities: Any) -> np.ndarray:
+    '''
+    Convert a result, a bit string dict or a probability list to an array indexed by basis state.
+    The leftmost character of a bit string is the most significant bit of the index.
+    '''
+    if hasattr(probabilities, 'probability_array') and len(probabilities.probability_array) > 0:
+        probabilities = probabilities.probability_array
+    elif hasattr(probabilities, 'probabilities'):
+        probabilities = probabilities.probabilities
+
+    if isinstance(probabilities, dict):
+        if len(probabilities) == 0:
+            raise ValueError('The probability dict is empty.')
+        qubit_num = len(next(iter(probabilities)))
+        prob_array = np.zeros(2 ** qubit_num, dtype=float)
+        for key, p in probabilities.items():
+            prob_array[int(key, 2)] = p
+        return prob_array
+
+    prob_array = np.asarray(probabilities, dtype=float).ravel()
+    qubit_num = int(np.log2(len(prob_array)))
+    if 2 ** qubit_num != len(prob_array):
+        raise ValueError('The length of the probability array must be a power of 2.')
+    return prob_array
+
+def _prepare(probabilities: Any, qubits: Optional[List[int]]) -> np.ndarray:
+    prob_array = probabilities_to_array(probabilities)
+    if qubits is not None:
+        prob_array = marginalize_qubits(prob_array, list(qubits))
+    prob_array = np.clip(prob_array, 0.0, None)
+    total = prob_array.sum()
+    if total <= 0:
+        raise ValueError('The probabilities must have a positive sum.')
+    return prob_array / total
+
+def sample_readings(probabilities: Any, shots: int, qubits: Optional[List[int]] = None,
+                    seed: Union[None, int, np.random.Generator] = None) -> np.ndarray:
+    '''
+    Draw all the shots in one call and return the outcomes as integers indexed by basis state.
+    If qubits is given, the distribution is first marginalized to these qubits in the given order.
+    '''
+    prob_array = _prepare(probabilities, qubits)
+    rng = np.random.default_rng(seed)
+    cdf = np.cumsum(prob_array)
+    outcomes = np.searchsorted(cdf, rng.random(shots) * cdf[-1], side='right')
+    return np.minimum(outcomes, len(prob_array) - 1)
+
+def sample_counts(probabilities: Any, shots: int, qubits: Optional[List[int]] = None,
+                  seed: Union[None, int, np.random.Generator] = None) -> np.ndarray:
+    '''
+    Return the counts of all the shots in an array indexed by basis state.
+    '''
+    prob_array = _prepare(probabilities, qubits)
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(shots, prob_array)
+
+def readings_to_bitstrings(outcomes: np.ndarray, qubit_num: int) -> List[str]:
+    return [format(int(x), '0' + str(qubit_num) + 'b') for x in outcomes]
+
+def counts_to_dict(counts: np.ndarray) -> Dict[str, int]:
+    qubit_num = int(np.log2(len(counts)))
+    nonzero = np.flatnonzero(counts)
+    return {format(int(i), '0' + str(qubit_num) + 'b'): int(counts[i]) for i in nonzero}
@@ -0,0 +1,69 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Callable, Optional
+from contextlib import contextmanager
+from queue import Queue, Empty
+from spinqkit.compiler import IntermediateRepresentation
+from .basic_simulator_backend import BasicSimulatorBackend, BasicSimulatorConfig
+from .async_execution import AsyncExecutionMixin
+
+class SimulatorPool(AsyncExecutionMixin):
+    '''
+    A fixed number of independent simulator instances.
+    A checked out instance belongs to one caller until it is checked in, so concurrent executions never share
+    a simulator. execute borrows an instance for one call, and execute_async runs on a thread pool of the same size.
+    The simulator releases the GIL while it evolves the state, so the instances run in parallel on threads.
+    Reading the circuit and building the result still hold the GIL.
+    '''
+    def __init__(self, size: int = 4, backend_factory: Callable = BasicSimulatorBackend):
+        if size <= 0:
+            raise ValueError('The pool size must be positive.')
+        self.__size = size
+        self.__idle = Queue()
+        for _ in range(size):
+            self.__idle.put(backend_factory())
+        self.configure_executor(size)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def idle_count(self) -> int:
+        return self.__idle.qsize()
+
+    def checkout(self, timeout: Optional[float] = None) -> BasicSimulatorBackend:
+        '''
+        Wait for an idle instance. TimeoutError is raised if none is checked in before the timeout.
+        '''
+        try:
+            return self.__idle.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError('No simulator is checked in within ' + str(timeout) + ' seconds.')
+
+    def checkin(self, backend: BasicSimulatorBackend):
+        self.__idle.put(backend)
+
+    @contextmanager
+    def backend(self, timeout: Optional[float] = None):
+        simulator = self.checkout(timeout)
+        try:
+            yield simulator
+        finally:
+            self.checkin(simulator)
+
+    def execute(self, ir: IntermediateRepresentation, config: BasicSimulatorConfig):
+        with self.backend() as simulator:
+            return simulator.execute(ir, config)
@@ -0,0 +1,81 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional
+import numpy as np
+from .backend_util import marginalize_qubits
+from .sampling import sample_readings, readings_to_bitstrings
+
+EPSILON = 1e-10
+
+class SimulatorResult(object):
+    '''
+    The result of the Python simulation paths, with the same interface as the result of the basic simulator.
+    The probabilities are kept in an array indexed by basis state, the string keyed dicts are built on request.
+    '''
+    def __init__(self, probability_array: np.ndarray, states: Optional[np.ndarray] = None, shots: int = 1024,
+                 counts: Optional[Dict[str, int]] = None):
+        self.probability_array = np.asarray(probability_array, dtype=float)
+        self.states = states if states is not None else np.zeros(0, dtype=complex)
+        self.shots = shots
+        self.__probabilities = None
+        self.__counts = counts
+
+    @classmethod
+    def from_state(cls, states: np.ndarray, mqubits: Optional[List[int]] = None, shots: int = 1024) -> 'SimulatorResult':
+        '''
+        Like the basic simulator, the probabilities are marginalized to mqubits in ascending order if given.
+        '''
+        states = np.ascontiguousarray(states, dtype=complex).ravel()
+        probs = np.abs(states) ** 2
+        qubit_num = int(np.log2(len(probs)))
+        if mqubits is not None and 0 < len(set(mqubits)) < qubit_num:
+            positions = sorted(q for q in set(mqubits) if 0 <= q < qubit_num)
+            probs = marginalize_qubits(probs, positions)
+        return cls(probs, states, shots)
+
+    @property
+    def probabilities(self) -> Dict[str, float]:
+        if self.__probabilities is None:
+            qubit_num = int(np.log2(len(self.probability_array)))
+            nonzero = np.flatnonzero(self.probability_array > EPSILON)
+            keys = readings_to_bitstrings(nonzero, qubit_num)
+            self.__probabilities = {k: float(self.probability_array[i]) for k, i in zip(keys, nonzero)}
+            total = sum(self.__probabilities.values())
+            if len(keys) > 0 and abs(1.0 - total) > EPSILON:
+                self.__probabilities[keys[-1]] += 1.0 - total
+        return self.__probabilities
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        '''
+        The counts are the probabilities times the shots rounded down, the rest of the shots go to the readings
+        rounded down the most, in the order of the readings.
+        '''
+        if self.__counts is None:
+            probs = self.probabilities
+            keys = list(probs.keys())
+            values = np.array([probs[k] for k in keys]) * self.shots
+            cnt = values.astype(int)
+            less = [k for k, v in zip(keys, values) if round(v) > v]
+            counts = {k: int(c) for k, c in zip(keys, cnt) if c > 0}
+            rest = self.shots - int(cnt.sum())
+            for k in less[:max(rest, 0)]:
+                counts[k] = counts.get(k, 0) + 1
+            self.__counts = counts
+        return self.__counts
+
+    def get_random_reading(self) -> str:
+        qubit_num = int(np.log2(len(self.probability_array)))
+        return readings_to_bitstrings(sample_readings(self.probability_array, 1), qubit_num)[0]
@@ -12,19 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from spinqkit.backend.client.spinq_cloud_client import SpinQCloudClient
+from spinqkit.backend.client.spinq_cloud_client import SpinQCloudClient, HOST
 from spinqkit.model.spinqCloud.platform import *
-from spinqkit.model.spinqCloud.task import Task
+from spinqkit.model.spinqCloud.task import Task, TaskStatus
 from spinqkit.model.spinqCloud.circuit import graph_to_circuit, convert_cz
 from spinqkit.model.exceptions import *
 from spinqkit.compiler.ir import NodeType, IntermediateRepresentation
 from spinqkit.model.basic_gate import GateBuilder
 from spinqkit.model import I, H, X, Y, Z, Rx, Ry, Rz, P, T, Td, S, Sd, CX, CNOT, CY, CZ, CP, SWAP, CCX, U, MEASURE #, BARRIER
 from spinqkit.model import Instruction
-from .layout import generate_direct_layout, generate_routing_layout, collect_gate_qubits, generate_lookahead_routing
-from typing import List, Optional
+from .layout import generate_subgraph_layout, generate_routing_layout, collect_gate_qubits, generate_lookahead_routing
+from .async_execution import AsyncExecutionMixin, ExecutionFuture
+from .result_cache import ResultCache, task_key
+from .cloud_catalog import CloudCatalog, shared_catalog
+from typing import List, Optional, Union
 from math import pi
-from threading import Thread
+from threading import Thread, Event
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
 from datetime import datetime
 import json
 import pdb
@@ -43,54 +48,122 @@ CZ_converter_builder.append(CX, [0, 1])
 CZ_converter_builder.append(H, [1])
 CZ_converter = CZ_converter_builder.to_gate()
 
-class SpinQCloudBackend:
-    def __init__(self, username: str, signature: str) -> None:
-        self._api_client = SpinQCloudClient(username, signature)
+class SpinQCloudConfig:
+    def __init__(self, platform_code: str):
+        self.metadata = {'platform_code': platform_code}
+
+    def configure_shots(self, shots: int):
+        self.metadata['shots'] = shots
+
+    def configure_calc_matrix(self, calc_matrix: bool):
+        self.metadata['calc_matrix'] = calc_matrix
+
+    def configure_task(self, task_name: str, task_desc: str = None):
+        self.metadata['task_name'] = task_name
+        self.metadata['task_desc'] = task_desc
+
+    def configure_timeout(self, timeout: int):
+        self.metadata['timeout'] = timeout
+
+def _fetch_platforms(api_client: SpinQCloudClient) -> List[Platform]:
+    res = api_client.retrieve_remote_platforms()
+    if res:
+        res_entity = json.loads(res.content)
+        platforms = []
+        for p in res_entity["items"]:
+            gate_list = []
+            for gname in p["supportGateName"]:
+                gate_list.append(find_gate(gname))
+            if p["couplingMap"] is not None:
+                coupling_map = []
+                for edge in p["couplingMap"]:
+                    coupling_map.append((edge[0]-1, edge[1]-1))
+            else:
+                coupling_map = None
+            platforms.append(Platform(p["pcode"], p["pname"], p["maxBitNum"], p["countOnlineMachine"], gate_list, coupling_map))
+        return platforms
+    else:
+        raise SpinQCloudServerError("Error occurs when retrieving platforms on cloud.")
+
+class SpinQCloudBackend(AsyncExecutionMixin):
+    def __init__(self, username: str, signature: str, host: str = HOST, catalog: Optional[CloudCatalog] = None) -> None:
+        '''
+        The login token and the platform list are shared with the other backends of the same account through
+        catalog, the process-wide shared_catalog() by default, so only the first backend waits for the server.
+        '''
+        self._api_client = SpinQCloudClient(username, signature, host=host)
+        self._catalog = catalog if catalog is not None else shared_catalog()
         self._platforms = []
         self.__qubit_mapping = None
+        self._result_cache = None
+        self._compact_payload = False
+        self._compress_payload = False
         self._login()
-        self.refresh_remote_platforms()
+        self._platforms = self._catalog.platforms(self._api_client, _fetch_platforms)
 
     def _login(self):
-        self._api_client.login()
+        self._catalog.login(self._api_client)
+
+    def configure_result_cache(self, cache: Optional[ResultCache]):
+        '''
+        With a result cache, a task identical to a cached one is not submitted, and a completed Task with
+        the cached result is returned instead. The results of the submitted tasks are cached when retrieved.
+        '''
+        self._result_cache = cache
+
+    def configure_payload_encoding(self, compact: bool = True, compress: bool = True):
+        '''
+        With compact, the circuits are submitted as arrays with a table of the distinct gates, see
+        Circuit.to_compact_dict, and with compress, the request bodies are gzipped. If the server rejects
+        a compact request and accepts the verbose one, the backend goes back to the verbose encoding.
+        '''
+        self._compact_payload = compact
+        self._compress_payload = compress
 
     def filterOutUnused(self, ir: IntermediateRepresentation):
         '''
-        Return a subgraph of the origin graph with no unused definitions
+        Remove the definitions which are not called by the main thread, directly or through other called definitions
+        '''
+        dag = ir.dag
+        adjacency = dag.get_adjlist(mode='out')
+        types = dag.vs['type']
+        names = dag.vs['name']
+        def_list = [d.index for d in dag.vs.select(type=NodeType.definition.value, _indegree=0)]
+        # a caller calls the first definition with its name
+        def_index = {}
+        for d in def_list:
+            def_index.setdefault(names[d], d)
+
+        # one breadth first search from the registers, which continues into the definition of each caller
+        reached = set(v.index for v in dag.vs.select(type=NodeType.register.value, _indegree=0))
+        queue = deque(reached)
+        while len(queue) > 0:
+            vidx = queue.popleft()
+            successors = adjacency[vidx]
+            if types[vidx] == NodeType.caller.value and names[vidx] in def_index:
+                successors = successors + [def_index[names[vidx]]]
+            for s in successors:
+                if s not in reached:
+                    reached.add(s)
+                    queue.append(s)
+
+        unused = set(d for d in def_list if d not in reached)
+        queue = deque(unused)
+        while len(queue) > 0:
+            for s in adjacency[queue.popleft()]:
+                if s not in unused:
+                    unused.add(s)
+                    queue.append(s)
+        dag.delete_vertices(unused)
+
+    def assemble(self, platform_code: str, ir: IntermediateRepresentation) -> IntermediateRepresentation:
+        '''
+        Return the executable lowered from the IR for the platform, which is cached on the IR. 
+        The IR itself is not changed.
         '''
-        start_list = ir.dag.vs.select(type=NodeType.register.value, _indegree=0)
-        unused_def_list = ir.dag.vs.select(type=NodeType.definition.value, _indegree=0)
-        unused_def_list = list(unused_def_list)
-
-
-        passed_idx_set = set()
-        for v in start_list:
-            sub_idx_list, _, _ = ir.dag.bfs(v.index)
-            passed_idx_set.update(sub_idx_list)
-        
-        passed_vs_list = [ir.dag.vs[i] for i in passed_idx_set]
-
-        for idx, v in enumerate(passed_vs_list):
-            if v['type'] == NodeType.caller.value:
-                def_v_list = [d for d in unused_def_list if d['name'] == v['name']]
-                #  ir.dag.vs.find(v['name'], type=NodeType.definition.value)
-                def_v = None if len(def_v_list) == 0 else def_v_list[0]
-                if def_v is not None:
-                    sub_idx_list, _, _ = ir.dag.bfs(def_v.index)
-                    sub_vx_list = [ir.dag.vs[i] for i in sub_idx_list]
-                    for subv in sub_vx_list:
-                        if subv not in passed_vs_list:
-                            passed_vs_list.append(subv)
-                    unused_def_list.remove(def_v)
-
-        unused_sub_idx_set = set()
-        for unused_def_v in unused_def_list:
-            sub_idx_list , _, _ = ir.dag.bfs(unused_def_v.index)
-            unused_sub_idx_set.update(sub_idx_list)
-        
-        ir.dag.delete_vertices(unused_sub_idx_set)
-
-    def assemble(self, platform_code: str, ir: IntermediateRepresentation):
+        return ir.get_executable((SpinQCloudBackend.__name__, platform_code), lambda exe: self._lower(platform_code, exe))
+
+    def _lower(self, platform_code: str, ir: IntermediateRepresentation):
 
         self.filterOutUnused(ir)
         i = 0
@@ -199,41 +272,39 @@ class SpinQCloudBackend:
                         raise CircuitOperationValidationError("Current platform does not support " + v['name'] + " gate.")
             i += 1
 
-    def refresh_remote_platforms(self):
-        res = self._platforms = self._api_client.retrieve_remote_platforms()
-        if res:
-            res_entity = json.loads(res.content)
-            self._platforms = []
-            for p in res_entity["items"]:
-                gate_list = []
-                for gname in p["supportGateName"]:
-                    gate_list.append(find_gate(gname))
-                if p["couplingMap"] is not None:
-                    coupling_map = []
-                    for edge in p["couplingMap"]:
-                        coupling_map.append((edge[0]-1, edge[1]-1))
-                else:
-                    coupling_map = None
-                self._platforms.append(Platform(p["pcode"], p["pname"], p["maxBitNum"], p["countOnlineMachine"], gate_list, coupling_map))
-        else:
-            raise SpinQCloudServerError("Error occurs when retrieving platforms on cloud.")
+    def refresh_remote_platforms(self, max_age: float = 0.0):
+        '''
+        Fetch the platform list from the cloud if the cached one is older than max_age seconds.
+        '''
+        self._platforms = self._catalog.platforms(self._api_client, _fetch_platforms, max_age)
 
     def get_local_platforms(self):
         return [Gemini, NMR_4, NMR_6, Superconductor]
 
     @property
     def platforms(self):
+        self._platforms = self._catalog.platforms(self._api_client, _fetch_platforms)
         return self._platforms
 
     def get_platform(self, code: str) -> Platform:
-        if len(self._platforms) == 0:
-            raise NotFoundError("No platform is available.")
-        for p in self._platforms:
+        platform = self._find_platform(code, self.platforms)
+        if platform is None:
+            # the platform may be new on the cloud
+            self.refresh_remote_platforms(self._catalog.min_refresh_interval)
+            platform = self._find_platform(code, self._platforms)
+        if platform is None:
+            if len(self._platforms) == 0:
+                raise NotFoundError("No platform is available.")
+            raise NotFoundError("No plaform matches code = " + code)
+        return platform
+
+    def _find_platform(self, code: str, platforms: List[Platform]) -> Optional[Platform]:
+        for p in platforms:
             if p.code == code: return p
-        raise NotFoundError("No plaform matches code = " + code)
+        return None
 
     def transpile(self, platform_code: str, ir: IntermediateRepresentation):
-        self.assemble(platform_code, ir)
+        ir = self.assemble(platform_code, ir)
 
         p = self.get_platform(platform_code)
         gate_couplings = collect_gate_qubits(ir)
@@ -241,16 +312,20 @@ class SpinQCloudBackend:
         couplings = [coupling for _, coupling in gate_couplings if len(coupling) > 1]
 
         # see if tepological problem can be solved by switch qubits
-        qubit_mapping, message = generate_direct_layout(ir.dag['qnum'], couplings, p.max_bitnum, p.coupling_map)
+        qubit_mapping, perfect, message = generate_subgraph_layout(ir.dag['qnum'], couplings, p.max_bitnum, p.coupling_map)
 
         # if failed, add swap
         swap_fixes, gate_updates = None, None
-        if qubit_mapping is None:
-            # optimize by switching qubits before swapping
-            qubit_mapping = generate_routing_layout(ir.dag['qnum'], couplings, p.max_bitnum, p.coupling_map)
+        if not perfect:
+            # start routing from the layout which needs the least swaps
             init_mapping = qubit_mapping.copy()
-            # add swap
-            swap_fixes, gate_updates = generate_lookahead_routing(gate_couplings, p.coupling_map, qubit_mapping)
+            try:
+                swap_fixes, gate_updates = generate_lookahead_routing(gate_couplings, p.coupling_map, qubit_mapping)
+            except RoutingError:
+                # the routing does not handle every start, route from the trivial layout as before
+                qubit_mapping = generate_routing_layout(ir.dag['qnum'], couplings, p.max_bitnum, p.coupling_map)
+                init_mapping = qubit_mapping.copy()
+                swap_fixes, gate_updates = generate_lookahead_routing(gate_couplings, p.coupling_map, qubit_mapping)
         else:
             init_mapping = qubit_mapping.copy()
 
@@ -258,29 +333,112 @@ class SpinQCloudBackend:
         return circuit, qubit_mapping
 
     def submit_task(self, platform_code: str, ir: IntermediateRepresentation, name: str = "Utitled Task", calc_matrix: bool = False, shots: Optional[int] = None, process_now: bool = True, description: str = None):
+        self._check_platform(platform_code)
+        newTask = self._prepare_task(platform_code, ir, name, calc_matrix, shots, process_now, description)
+        return self._create_task(newTask)
+
+    def submit_tasks(self, irs: List[IntermediateRepresentation], platform_code: str, names: Union[str, List[str]] = "Utitled Task", calc_matrix: bool = False, shots: Optional[int] = None, process_now: bool = True, description: str = None, max_workers: int = 4, submit_workers: int = 4) -> List[Union[Task, Exception]]:
+        '''
+        Submit many IRs to one platform. The IRs are transpiled and converted on a pool of max_workers threads,
+        and each circuit is sent on a pool of submit_workers threads as soon as it is ready, so the conversions
+        overlap the requests. The result has the Task of each IR in the order of irs, or the exception which
+        stopped it. A failed IR does not stop the others.
+        '''
+        if isinstance(names, str):
+            names = [names] * len(irs)
+        elif len(names) != len(irs):
+            raise ValueError("Got " + str(len(names)) + " task names for " + str(len(irs)) + " IRs.")
+        self._check_platform(platform_code)
+        results = [None] * len(irs)
+        submissions = {}
+        with ThreadPoolExecutor(max_workers) as prepare_pool, ThreadPoolExecutor(submit_workers) as submit_pool:
+            preparations = {prepare_pool.submit(self._prepare_task, platform_code, ir, names[i], calc_matrix, shots,
+                                                process_now, description): i for i, ir in enumerate(irs)}
+            for f in as_completed(preparations):
+                i = preparations[f]
+                if f.exception() is not None:
+                    results[i] = f.exception()
+                else:
+                    submissions[submit_pool.submit(self._create_task, f.result())] = i
+            for f in as_completed(submissions):
+                i = submissions[f]
+                results[i] = f.exception() if f.exception() is not None else f.result()
+        return results
+
+    def _check_platform(self, platform_code: str) -> Platform:
         platform = self.get_platform(platform_code)
-        if platform.machine_count > 0:
+        if platform.machine_count <= 0:
+            raise RequestPreconditionFailedError("No machine is running for this platform. Please try later.")
+        return platform
+
+    def _prepare_task(self, platform_code: str, ir: IntermediateRepresentation, name: str, calc_matrix: bool, shots: Optional[int], process_now: bool, description: str) -> Task:
+        try:
             circuit, qubit_mapping = self.transpile(platform_code, ir)
-            if circuit is None or len(circuit.operations) <= 0:
-                raise RequestPreconditionFailedError("Cannot submit a task with empty circuit.")
-            if platform_code == Superconductor.code and shots is None:
-                shots = 1000
-            newTask = Task(name, platform_code, circuit, qubit_mapping.phy_to_log, calc_matrix, shots, process_now, description, self._api_client)
-            res = self._api_client.create_task(newTask.to_request())
-            res_entity = json.loads(res.content)
-            if res:
-                newTask.set_task_code(res_entity["task"]["tcode"])
-                newTask.set_status(res_entity["task"]["tstatus"])
-                if res_entity["task"]["createdTime"] is not None:
-                    created_time = datetime.strptime(res_entity["task"]["createdTime"], '%Y-%m-%dT%H:%M:%S.%f%z')
-                    newTask.set_created_time(created_time)
-                else:
-                    newTask.set_created_time(None)
+        except CircuitOperationValidationError:
+            # the gate set of the platform may have changed on the cloud
+            platform = self.get_platform(platform_code)
+            self.refresh_remote_platforms(self._catalog.min_refresh_interval)
+            if self.get_platform(platform_code) is platform:
+                raise
+            circuit, qubit_mapping = self.transpile(platform_code, ir)
+        if circuit is None or len(circuit.operations) <= 0:
+            raise RequestPreconditionFailedError("Cannot submit a task with empty circuit.")
+        if platform_code == Superconductor.code and shots is None:
+            shots = 1000
+        return Task(name, platform_code, circuit, qubit_mapping.phy_to_log, calc_matrix, shots, process_now, description, self._api_client)
+
+    def _create_task(self, newTask: Task) -> Task:
+        cache = self._result_cache
+        if cache is not None:
+            key = task_key(newTask)
+            entry = cache.get(key)
+            if entry is not None:
+                newTask.set_task_code(entry[0])
+                newTask.set_status(TaskStatus.sccueeded.value)
+                newTask.set_run_result(entry[1])
                 return newTask
+            newTask.set_result_listener(lambda run: cache.put(key, newTask.task_code, run))
+        res = self._send_task(newTask)
+        res_entity = json.loads(res.content)
+        if res:
+            newTask.set_task_code(res_entity["task"]["tcode"])
+            newTask.set_status(res_entity["task"]["tstatus"])
+            if res_entity["task"]["createdTime"] is not None:
+                created_time = datetime.strptime(res_entity["task"]["createdTime"], '%Y-%m-%dT%H:%M:%S.%f%z')
+                newTask.set_created_time(created_time)
             else:
-                raise SpinQCloudServerError("Submit failed: " + res_entity["msg"] if res_entity.__contains__("msg") and res_entity["msg"] is not None else "Submit failed")
+                newTask.set_created_time(None)
+            return newTask
         else:
-            raise RequestPreconditionFailedError("No machine is running for this platform. Please try later.")
+            raise SpinQCloudServerError("Submit failed: " + res_entity["msg"] if res_entity.__contains__("msg") and res_entity["msg"] is not None else "Submit failed")
+
+    def _send_task(self, newTask: Task):
+        if self._compact_payload or self._compress_payload:
+            res = self._api_client.create_task(newTask.to_request(self._compact_payload), compress=self._compress_payload)
+            if res.status_code not in (400, 415, 422):
+                return res
+            res = self._api_client.create_task(newTask.to_request())
+            if res:
+                # the server does not accept the encoding
+                self._compact_payload = False
+                self._compress_payload = False
+            return res
+        return self._api_client.create_task(newTask.to_request())
+
+    def execute(self, ir: IntermediateRepresentation, config: SpinQCloudConfig, cancel_event: Optional[Event] = None):
+        '''
+        Submit a task and wait for its result. 
+        '''
+        meta = config.metadata
+        task = self.submit_task(meta['platform_code'], ir, meta.get('task_name', "Utitled Task"), 
+                                meta.get('calc_matrix', False), meta.get('shots'), description=meta.get('task_desc'))
+        return task.get_result(True, meta.get('timeout'), cancel_event)
+
+    def execute_async(self, ir: IntermediateRepresentation, config: SpinQCloudConfig) -> ExecutionFuture:
+        '''
+        Cancelling a running execution stops waiting for the result, the submitted task stays on the cloud.
+        '''
+        return self._get_async_executor().submit(self.execute, ir, config, pass_cancel_event=True)
 
     def get_task(self, task_code: str):
         res = self._api_client.get_task_by_code(task_code)
@@ -0,0 +1,308 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional, Tuple
+from math import cos, sin
+from cmath import exp
+import numpy as np
+from spinqkit.compiler.ir import IntermediateRepresentation, NodeType, Comparator
+from spinqkit.model import I, H, X, Y, Z, T, Td, S, Sd, U, SWAP, CCX
+
+_fixed_matrices = {
+    I.label: np.asarray(I.matrix(), dtype=complex),
+    H.label: np.asarray(H.matrix(), dtype=complex),
+    X.label: np.asarray(X.matrix(), dtype=complex),
+    Y.label: np.asarray(Y.matrix(), dtype=complex),
+    Z.label: np.asarray(Z.matrix(), dtype=complex),
+    T.label: np.asarray(T.matrix(), dtype=complex),
+    Td.label: np.asarray(Td.matrix(), dtype=complex),
+    S.label: np.asarray(S.matrix(), dtype=complex),
+    Sd.label: np.asarray(Sd.matrix(), dtype=complex),
+    'CX': np.array([[1,0,0,0], [0,1,0,0], [0,0,0,1], [0,0,1,0]], dtype=complex),
+    'CY': np.array([[1,0,0,0], [0,1,0,0], [0,0,0,-1j], [0,0,1j,0]], dtype=complex),
+    'CZ': np.diag([1, 1, 1, -1]).astype(complex),
+    'SWAP': np.array([[1,0,0,0], [0,0,1,0], [0,1,0,0], [0,0,0,1]], dtype=complex),
+    'CCX': np.eye(8, dtype=complex)[[0, 1, 2, 3, 4, 5, 7, 6]],
+}
+
+# U, SWAP and CCX are built by gate builders and carry generated labels
+_aliases = {U.label: 'U', SWAP.label: 'SWAP', CCX.label: 'CCX', 'CNOT': 'CX', 'YCON': 'CY', 'ZCON': 'CZ'}
+
+def canonical_gate_name(name: str) -> str:
+    return _aliases.get(name, name)
+
+class FlatOperation(object):
+    '''
+    One operation of an IR with global qubits and evaluated parameters.
+    If matrix is not None, the operation is a (controlled) unitary and the first ctrl_num qubits are the controls.
+    '''
+    __slots__ = ('name', 'qubits', 'params', 'clbits', 'condition', 'matrix', 'ctrl_num', 'inverse')
+
+    def __init__(self, name: str, qubits: List[int], params: Optional[List] = None, clbits: Optional[List[int]] = None,
+                 condition: Optional[Tuple] = None, matrix: Optional[np.ndarray] = None, ctrl_num: int = 0,
+                 inverse: bool = False):
+        self.name = canonical_gate_name(name)
+        self.qubits = list(qubits)
+        self.params = list(params) if params is not None else []
+        self.clbits = list(clbits) if clbits is not None else []
+        self.condition = condition
+        self.matrix = matrix
+        self.ctrl_num = ctrl_num
+        self.inverse = inverse
+
+    def __repr__(self) -> str:
+        return 'FlatOperation(' + self.name + ', ' + str(self.qubits) + ', ' + str(self.params) + ')'
+
+def gate_matrix(name: str, params: List) -> np.ndarray:
+    '''
+    The matrix of a basis gate, the first qubit of the gate is the most significant bit.
+    '''
+    name = canonical_gate_name(name)
+    if name in _fixed_matrices:
+        return _fixed_matrices[name]
+    if name == 'Rx':
+        c, s = cos(params[0] / 2), sin(params[0] / 2)
+        return np.array([[c, -1j * s], [-1j * s, c]], dtype=complex)
+    if name == 'Ry':
+        c, s = cos(params[0] / 2), sin(params[0] / 2)
+        return np.array([[c, -s], [s, c]], dtype=complex)
+    if name == 'Rz':
+        return np.array([[exp(-0.5j * params[0]), 0], [0, exp(0.5j * params[0])]], dtype=complex)
+    if name == 'P':
+        return np.array([[1, 0], [0, exp(1j * params[0])]], dtype=complex)
+    if name == 'U':
+        theta, phi, lamda = params[0], params[1], params[2]
+        c, s = cos(theta / 2), sin(theta / 2)
+        return np.array([[c, -exp(1j * lamda) * s], [exp(1j * phi) * s, exp(1j * (phi + lamda)) * c]], dtype=complex)
+    raise ValueError('The gate ' + name + ' has no matrix.')
+
+def controlled_matrix(base: np.ndarray, ctrl_num: int) -> np.ndarray:
+    size = base.shape[0] << ctrl_num
+    mat = np.eye(size, dtype=complex)
+    mat[size - base.shape[0]:, size - base.shape[0]:] = base
+    return mat
+
+def operation_matrix(op: FlatOperation) -> np.ndarray:
+    if op.matrix is None:
+        return gate_matrix(op.name, op.params)
+    base = np.asarray(op.matrix, dtype=complex)
+    if op.inverse:
+        base = base.conj().T
+    return controlled_matrix(base, op.ctrl_num) if op.ctrl_num > 0 else base
+
+def apply_matrix(state: np.ndarray, matrix: np.ndarray, qubits: List[int]) -> np.ndarray:
+    '''
+    Apply a gate matrix to a state tensor whose axis i is qubit i.
+    Trailing axes beyond the qubit axes are batch axes, e.g., the columns of an operator.
+    '''
+    k = len(qubits)
+    mat = matrix.reshape((2,) * (2 * k))
+    state = np.tensordot(mat, state, axes=(list(range(k, 2 * k)), list(qubits)))
+    return np.moveaxis(state, list(range(k)), list(qubits))
+
+def condition_satisfied(condition: Optional[Tuple], clbit_values: Dict[int, int]) -> bool:
+    '''
+    condition is (clbits, comparator, constant), clbits[0] is the least significant bit of the register value.
+    Clbits not in clbit_values are 0.
+    '''
+    if condition is None:
+        return True
+    clbits, cmp, constant = condition
+    value = 0
+    for k, c in enumerate(clbits):
+        value |= clbit_values.get(c, 0) << k
+    if cmp == Comparator.EQ.value:
+        return value == constant
+    elif cmp == Comparator.NE.value:
+        return value != constant
+    elif cmp == Comparator.LT.value:
+        return value < constant
+    elif cmp == Comparator.GT.value:
+        return value > constant
+    elif cmp == Comparator.LE.value:
+        return value <= constant
+    elif cmp == Comparator.GE.value:
+        return value >= constant
+    raise ValueError('Unknown comparator ' + str(cmp))
+
+def _node_condition(ir: IntermediateRepresentation, v) -> Optional[Tuple]:
+    if 'cmp' not in v.attributes() or v['cmp'] is None:
+        return None
+    return (ir.get_conbits(v.index), int(v['cmp']), int(v['constant']))
+
+def _node_clbits(ir: IntermediateRepresentation, v) -> List[int]:
+    if 'clbit' not in ir.dag.es.attributes():
+        return []
+    edges = sorted(v.in_edges(), key=lambda e: e.index)
+    return [e['clbit'] for e in edges if e['clbit'] is not None]
+
+def _node_params(v) -> List:
+    if 'params' not in v.attributes() or v['params'] is None:
+        return []
+    return v['params']
+
+def _evaluate_callee_params(callee, global_params: List) -> List:
+    if 'params' not in callee.attributes() or callee['params'] is None:
+        return []
+    params = []
+    start = 0
+    for p in callee['params']:
+        if not callable(p):
+            value = p
+        elif len(callee['pindex']) == 1 and callee['pindex'][0] == -1:
+            value = p(global_params)
+        else:
+            arg_count = p.__code__.co_argcount
+            local_args = [] if arg_count == 0 else callee['pindex'][start:start + arg_count]
+            start += arg_count
+            value = p(*[global_params[x] for x in local_args])
+        if isinstance(value, (list, tuple, np.ndarray)):
+            params.extend(value)
+        else:
+            params.append(value)
+    return params
+
+class _IRFlattener(object):
+    def __init__(self, ir: IntermediateRepresentation):
+        self.ir = ir
+        self.vs = ir.dag.vs
+        self.order = ir.dag.topological_sorting()
+        self.position = {v: i for i, v in enumerate(self.order)}
+        self.definitions = {}
+
+    def main_nodes(self) -> List[int]:
+        registers = [v.index for v in self.vs if v['type'] == NodeType.register.value]
+        reachable = set()
+        for r in registers:
+            reachable.update(self.ir.dag.subcomponent(r, mode='out'))
+        return [v for v in self.order if v in reachable]
+
+    def definition_nodes(self, name: str) -> List[int]:
+        if name not in self.definitions:
+            def_index = self.vs.find(name, type=NodeType.definition.value).index
+            nodes = self.ir.dag.subcomponent(def_index, mode='out')
+            nodes = [v for v in nodes if v != def_index]
+            nodes.sort(key=lambda v: self.position[v])
+            self.definitions[name] = nodes
+        return self.definitions[name]
+
+    def expand_caller(self, name: str, qubits: List[int], params: List, condition: Optional[Tuple],
+                      ops: List[FlatOperation]):
+        for c in self.definition_nodes(name):
+            callee = self.vs[c]
+            sub_qubits = [qubits[q] for q in callee['qubits']]
+            sub_params = _evaluate_callee_params(callee, params)
+            sub_condition = condition if condition is not None else _node_condition(self.ir, callee)
+            if callee['type'] == NodeType.caller.value:
+                self.expand_caller(callee['name'], sub_qubits, sub_params, sub_condition, ops)
+            else:
+                ops.append(FlatOperation(callee['name'], sub_qubits, sub_params, condition=sub_condition))
+
+    def flatten(self) -> List[FlatOperation]:
+        ops = []
+        for idx in self.main_nodes():
+            v = self.vs[idx]
+            vtype = v['type']
+            if vtype == NodeType.op.value:
+                if v['name'] == 'BARRIER':
+                    continue
+                ops.append(FlatOperation(v['name'], v['qubits'], _node_params(v), _node_clbits(self.ir, v),
+                                         _node_condition(self.ir, v)))
+            elif vtype == NodeType.caller.value:
+                self.expand_caller(v['name'], v['qubits'], _node_params(v), _node_condition(self.ir, v), ops)
+            elif vtype == NodeType.unitary.value:
+                matrix = np.asarray(v['matrix'])
+                target_num = int(np.log2(matrix.shape[0]))
+                ops.append(FlatOperation(v['name'], v['qubits'], condition=_node_condition(self.ir, v),
+                                         matrix=matrix, ctrl_num=len(v['qubits']) - target_num,
+                                         inverse=bool(v['inverse'])))
+        return ops
+
+def flatten_ir(ir: IntermediateRepresentation) -> List[FlatOperation]:
+    '''
+    List the operations of the main thread in a topological order, with the callers expanded
+    through their definitions in the same way as the basic simulator.
+    '''
+    return _IRFlattener(ir).flatten()
+
+def initial_state(qubit_num: int) -> np.ndarray:
+    state = np.zeros((2,) * qubit_num, dtype=complex)
+    state[(0,) * qubit_num] = 1.0
+    return state
+
+def simulate_operations(ops: List[FlatOperation], qubit_num: int, state: Optional[np.ndarray] = None) -> np.ndarray:
+    '''
+    Evolve a state tensor by unitary operations. Conditions are evaluated with all the clbits equal to 0.
+    '''
+    if state is None:
+        state = initial_state(qubit_num)
+    for op in ops:
+        if op.name == 'MEASURE':
+            raise ValueError('Measurements cannot be simulated on a state vector.')
+        if not condition_satisfied(op.condition, {}):
+            continue
+        state = apply_matrix(state, operation_matrix(op), op.qubits)
+    return state
+
+def remove_terminal_measurements(ops: List[FlatOperation]) -> List[FlatOperation]:
+    '''
+    Drop the measurements at the end of the qubits, which do not change the final distribution.
+    ValueError is raised if a measured qubit is used again or a condition follows a measurement.
+    '''
+    measured = set()
+    unitary_ops = []
+    for op in ops:
+        if op.name == 'MEASURE':
+            measured.update(op.qubits)
+            continue
+        if op.condition is not None and len(measured) > 0:
+            raise ValueError('A condition after a measurement needs the branching simulation.')
+        if measured.intersection(op.qubits):
+            raise ValueError('A mid-circuit measurement needs the branching simulation.')
+        unitary_ops.append(op)
+    return unitary_ops
+
+def embed_matrix(matrix: np.ndarray, qubits: List[int], targets: List[int]) -> np.ndarray:
+    '''
+    Extend a gate matrix on qubits to a matrix on targets, a superset of qubits in the given order.
+    '''
+    k = len(targets)
+    identity = np.eye(2 ** k, dtype=complex).reshape((2,) * k + (2 ** k,))
+    local = [targets.index(q) for q in qubits]
+    return apply_matrix(identity, matrix, local).reshape(2 ** k, 2 ** k)
+
+def fuse_operations(ops: List[FlatOperation], max_qubits: int = 2) -> List[Tuple[List[int], np.ndarray]]:
+    '''
+    Multiply runs of consecutive unitary operations into one matrix while they act on at most max_qubits qubits.
+    Return a list of (qubits, matrix). Measurements and conditions are not allowed.
+    '''
+    fused = []
+    block_qubits = None
+    block = None
+    for op in ops:
+        if op.name == 'MEASURE' or op.condition is not None:
+            raise ValueError('Only unitary operations can be fused.')
+        mat = operation_matrix(op)
+        if block_qubits is not None:
+            union = block_qubits + [q for q in op.qubits if q not in block_qubits]
+            if len(union) <= max_qubits:
+                block = embed_matrix(mat, op.qubits, union) @ embed_matrix(block, block_qubits, union)
+                block_qubits = union
+                continue
+            fused.append((block_qubits, block))
+        block_qubits = list(op.qubits)
+        block = mat
+    if block_qubits is not None:
+        fused.append((block_qubits, block))
+    return fused
@@ -0,0 +1,213 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Callable, Iterator, List, Optional
+from concurrent.futures import Future, CancelledError, InvalidStateError
+import concurrent.futures
+import heapq
+import itertools
+import random
+import threading
+import time
+from spinqkit.model.spinqCloud.task import Task, TaskStatus
+from spinqkit.model.exceptions import SpinQCloudServerError, TaskStatusError, RequestTimeoutError
+from .async_execution import ExecutionFuture
+
+def _settle(future: Future, result=None, exception: Optional[BaseException] = None):
+    # the polling thread and cancel() may settle a future at the same time
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+class TaskFuture(ExecutionFuture):
+    '''
+    The handle of a watched task. The result is the same as the result of Task.get_result.
+    Cancelling stops watching the task, the task stays on the cloud.
+    '''
+    def __init__(self, future: Future, cancel_event: threading.Event, task: Task):
+        super().__init__(future, cancel_event)
+        self.task = task
+
+    def cancel(self) -> bool:
+        self._cancel_event.set()
+        if self._future.done():
+            return False
+        _settle(self._future, exception=CancelledError())
+        return True
+
+class _Watch(object):
+    __slots__ = ('future', 'interval', 'deadline', 'errors')
+
+    def __init__(self, future: TaskFuture, interval: float, deadline: Optional[float]):
+        self.future = future
+        self.interval = interval
+        self.deadline = deadline
+        self.errors = 0
+
+class TaskWatcher(object):
+    '''
+    Wait for many cloud tasks on one polling thread.
+    Each task is polled after a delay which grows by multiplier up to max_interval while the task is pending
+    or queued, and up to processing_interval once it is processing. Every delay is shortened by a random
+    fraction up to jitter, so the polls of tasks submitted together spread out.
+    A task fails after max_errors consecutive failed polls.
+    '''
+    def __init__(self, initial_interval: float = 1.0, max_interval: float = 30.0, processing_interval: float = 5.0,
+                 multiplier: float = 2.0, jitter: float = 0.5, max_errors: int = 3, seed: Optional[int] = None):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.processing_interval = processing_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_errors = max_errors
+        self.__rng = random.Random(seed)
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__watches = {}
+        self.__cond = threading.Condition()
+        self.__thread = None
+        self.__closed = False
+
+    def __len__(self) -> int:
+        '''
+        The number of the tasks which are not finished.
+        '''
+        with self.__cond:
+            return sum(1 for w in self.__watches.values() if not w.future.done())
+
+    def watch(self, task: Task, callback: Optional[Callable[[TaskFuture], None]] = None,
+              timeout: Optional[float] = None) -> TaskFuture:
+        '''
+        Start watching a submitted task. callback is called with the TaskFuture when the task finishes,
+        on the polling thread. A task which is already watched returns its existing future.
+        '''
+        if task.task_code is None:
+            raise TaskStatusError('The task is not submitted.')
+        with self.__cond:
+            if self.__closed:
+                raise RuntimeError('The watcher is closed.')
+            watch = self.__watches.get(task.task_code)
+            if watch is None or watch.future.done():
+                future = Future()
+                future.set_running_or_notify_cancel()
+                deadline = None if timeout is None else time.monotonic() + timeout
+                watch = _Watch(TaskFuture(future, threading.Event(), task), self.initial_interval, deadline)
+                self.__watches[task.task_code] = watch
+                self._schedule(watch, self._jittered(self.initial_interval))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self._run, name='TaskWatcher', daemon=True)
+                self.__thread.start()
+        if callback is not None:
+            watch.future.add_done_callback(callback)
+        return watch.future
+
+    def watch_all(self, tasks: List[Task], callback: Optional[Callable[[TaskFuture], None]] = None,
+                  timeout: Optional[float] = None) -> List[TaskFuture]:
+        return [self.watch(t, callback, timeout) for t in tasks]
+
+    def as_completed(self, futures: Optional[List[TaskFuture]] = None, timeout: Optional[float] = None) -> Iterator[TaskFuture]:
+        '''
+        Yield the futures as their tasks finish, all the unfinished tasks if futures is None.
+        '''
+        if futures is None:
+            with self.__cond:
+                futures = [w.future for w in self.__watches.values()]
+        by_inner = {f._future: f for f in futures}
+        for inner in concurrent.futures.as_completed(by_inner.keys(), timeout):
+            yield by_inner[inner]
+
+    def close(self, wait: bool = True):
+        '''
+        Stop polling. The unfinished tasks are cancelled, they stay on the cloud.
+        '''
+        with self.__cond:
+            self.__closed = True
+            watches = list(self.__watches.values())
+            self.__cond.notify_all()
+        for w in watches:
+            self._finish(w, exception=CancelledError())
+        if wait and self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def _jittered(self, interval: float) -> float:
+        return interval * (1.0 - self.jitter * self.__rng.random())
+
+    def _schedule(self, watch: _Watch, delay: float):
+        with self.__cond:
+            heapq.heappush(self.__heap, (time.monotonic() + delay, next(self.__counter), watch))
+            self.__cond.notify()
+
+    def _finish(self, watch: _Watch, result=None, exception: Optional[BaseException] = None):
+        with self.__cond:
+            # the code may be watched again by a newer watch
+            if self.__watches.get(watch.future.task.task_code) is watch:
+                del self.__watches[watch.future.task.task_code]
+        _settle(watch.future._future, result, exception)
+
+    def _next_interval(self, watch: _Watch, status: Optional[str]) -> float:
+        limit = self.processing_interval if status == TaskStatus.processing.value else self.max_interval
+        watch.interval = min(watch.interval * self.multiplier, limit)
+        return self._jittered(watch.interval)
+
+    def _poll(self, watch: _Watch):
+        task = watch.future.task
+        if watch.future.done():
+            # cancelled, drop the watch
+            self._finish(watch)
+            return
+        if watch.deadline is not None and time.monotonic() >= watch.deadline:
+            self._finish(watch, exception=RequestTimeoutError('Find result timeout.'))
+            return
+        if task.completed:
+            self._finish(watch, task._get_result())
+            return
+        try:
+            status = task.get_status()
+            task.set_status(status)
+            if status == TaskStatus.sccueeded.value:
+                try:
+                    self._finish(watch, task._get_result())
+                    return
+                except TaskStatusError:
+                    # the result is not stored yet
+                    status = TaskStatus.processing.value
+            elif status in (TaskStatus.failed.value, TaskStatus.deleted.value):
+                self._finish(watch, exception=SpinQCloudServerError('Task ' + task.task_code + ' ended with status ' + status + '.'))
+                return
+            watch.errors = 0
+        except Exception as e:
+            watch.errors += 1
+            if watch.errors >= self.max_errors:
+                self._finish(watch, exception=e)
+                return
+            status = None
+        delay = self._next_interval(watch, status)
+        if watch.deadline is not None:
+            delay = min(delay, max(0.0, watch.deadline - time.monotonic()))
+        self._schedule(watch, delay)
+
+    def _run(self):
+        while True:
+            with self.__cond:
+                while not self.__closed and (len(self.__heap) == 0 or self.__heap[0][0] > time.monotonic()):
+                    wait = None if len(self.__heap) == 0 else self.__heap[0][0] - time.monotonic()
+                    self.__cond.wait(wait)
+                if self.__closed:
+                    return
+                _, _, watch = heapq.heappop(self.__heap)
+            self._poll(watch)
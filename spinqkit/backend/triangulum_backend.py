@@ -13,8 +13,10 @@
 # limitations under the License.
 
 from math import pi
+from threading import Lock
 from igraph import Graph
 from .backend_util import get_graph_capsule
+from .async_execution import AsyncExecutionMixin
 from spinqkit.compiler import IntermediateRepresentation, NodeType
 from spinqkit.model import Instruction
 from spinqkit.model import I, H, X, Y, Z, Rx, Ry, Rz, T, Td, S, Sd, P, CX, CY, CZ, SWAP, CCX, U, MEASURE
@@ -41,11 +43,19 @@ class TriangulumConfig:
         self.metadata['task_name'] = task_name
         self.metadata['task_desc'] = task_desc
 
-class TriangulumBackend:
+class TriangulumBackend(AsyncExecutionMixin):
     def __init__(self):
         self.machine = Triangulum()
+        # one instance runs one execution at a time
+        self.__lock = Lock()
 
-    def assemble(self, ir: IntermediateRepresentation):
+    def assemble(self, ir: IntermediateRepresentation) -> IntermediateRepresentation:
+        '''
+        Return the executable lowered from the IR, which is cached on the IR. The IR itself is not changed.
+        '''
+        return ir.get_executable((TriangulumBackend.__name__, None), self._lower)
+
+    def _lower(self, ir: IntermediateRepresentation):
         if 'qnum' not in ir.dag.attributes() or ir.dag['qnum'] <= 0 or ir.dag['qnum'] > 3:
             raise Exception('Triangulum only supports a circuit with 0 to 3 qubits.')
         i = 0
@@ -127,5 +137,6 @@ class TriangulumBackend:
             i += 1
 
     def execute(self, ir: IntermediateRepresentation, config: TriangulumConfig):
-        self.assemble(ir)
-        return self.machine.execute(get_graph_capsule(ir.dag), config.metadata)
\ No newline at end of file
+        exe = self.assemble(ir)
+        with self.__lock:
+            return self.machine.execute(get_graph_capsule(exe.dag), config.metadata)
\ No newline at end of file
@@ -0,0 +1,55 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from spinqkit.compiler import IntermediateRepresentation
+from .statevector_util import flatten_ir, fuse_operations, apply_matrix, operation_matrix
+from .async_execution import AsyncExecutionMixin
+
+def calculate_unitary(ir: IntermediateRepresentation, fusion: bool = True, max_fused_qubits: int = 2) -> np.ndarray:
+    '''
+    Calculate the matrix of a circuit, where qubit 0 is the most significant bit of a row or column index.
+    The operator is kept as a tensor with one axis per qubit plus the column axis, and each gate is
+    contracted with it, which costs O(4^n) per gate instead of O(8^n) for a dense product.
+    With fusion, consecutive gates on at most max_fused_qubits qubits are multiplied together first.
+    '''
+    qubit_num = ir.dag['qnum'] if 'qnum' in ir.dag.attributes() else ir.qnum
+    ops = flatten_ir(ir)
+    if any(op.name == 'MEASURE' or op.condition is not None for op in ops):
+        raise ValueError('A circuit with measurements or conditions has no unitary.')
+    dim = 2 ** qubit_num
+    operator = np.eye(dim, dtype=complex).reshape((2,) * qubit_num + (dim,))
+    if fusion:
+        blocks = fuse_operations(ops, max_fused_qubits)
+    else:
+        blocks = [(op.qubits, operation_matrix(op)) for op in ops]
+    for qubits, mat in blocks:
+        operator = apply_matrix(operator, mat, qubits)
+    return np.ascontiguousarray(operator).reshape(dim, dim)
+
+class UnitarySimulatorConfig:
+    def __init__(self):
+        self.metadata = {}
+
+    def configure_fusion(self, fusion: bool = True, max_fused_qubits: int = 2):
+        self.metadata['fusion'] = fusion
+        self.metadata['max_fused_qubits'] = max_fused_qubits
+
+class UnitarySimulatorBackend(AsyncExecutionMixin):
+    '''
+    Calculate the unitary matrix of an IR instead of a state. execute returns a NumPy array.
+    '''
+    def execute(self, ir: IntermediateRepresentation, config: UnitarySimulatorConfig = None) -> np.ndarray:
+        metadata = config.metadata if config is not None else {}
+        return calculate_unitary(ir, metadata.get('fusion', True), metadata.get('max_fused_qubits', 2))
@@ -19,6 +19,7 @@
 #include "model/result.h"
 #include <pybind11/stl.h>
 #include <pybind11/complex.h>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 
 namespace py = pybind11;
@@ -35,10 +36,24 @@ PYBIND11_MODULE(spinq_backends, m) {
     .def(py::init<>())
     .def("execute", &Triangulum::execute);
 
+    // states and probability_array are numpy views on the result buffers without copy.
+    // The views keep the result object alive.
     py::class_<Result>(m, "Result")
     .def(py::init<>())
-    .def_readwrite("counts", &Result::counts)
-    .def_readwrite("states", &Result::states)
-    .def_readwrite("probabilities", &Result::probabilities)
+    .def_property("counts", &Result::get_counts, 
+        [](Result &r, const map<string, int> &c) { r.counts = c; })
+    .def_property("states", 
+        [](py::object self) {
+            Result &r = self.cast<Result &>();
+            return py::array_t<complex<double>>(r.states.size(), r.states.data(), self);
+        },
+        [](Result &r, const vector<complex<double>> &sv) { r.states = sv; })
+    .def_property_readonly("probability_array", 
+        [](py::object self) {
+            Result &r = self.cast<Result &>();
+            return py::array_t<double>(r.probability_vector.size(), r.probability_vector.data(), self);
+        })
+    .def_property("probabilities", &Result::get_probabilities, 
+        [](Result &r, const map<string, double> &p) { r.probabilities = p; })
     .def("get_random_reading", &Result::get_random_reading);
 }
\ No newline at end of file
@@ -19,7 +19,13 @@ from abc import abstractmethod, ABCMeta
 class Compiler(metaclass=ABCMeta):
 
     def __init__(self):
-        pass
+        self.checker = None
+
+    def configure_verification(self, checker: Any = None):
+        '''
+        Check the optimization passes by an EquivalenceChecker, None disables the check.
+        '''
+        self.checker = checker
 
     @abstractmethod
     def compile(self, code: Any, level: int):
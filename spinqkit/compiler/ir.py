@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Callable
+from typing import Any, Dict, List, Callable, Hashable, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock, RLock
 from igraph import *
 from spinqkit.model import I, H, X, Y, Z, Rx, Ry, Rz, T, Td, S, Sd, P, CX, CY, CZ, SWAP, CCX, U, MEASURE
 from spinqkit.model import Instruction, Gate
@@ -38,6 +40,8 @@ class Comparator(enum.Enum):
     GE = 5
 
 class IntermediateRepresentation():
+    # the number of executables cached on one IR, e.g., for the backends and platforms it runs on
+    max_executables = 8
     basis_set = {I, H, X, Y, Z, Rx, Ry, Rz, T, Td, S, Sd, P, CX, CY, CZ, SWAP, CCX, U, MEASURE} # 只包含硬件直接支持的门
     label_set = {g.label for g in basis_set}
 
@@ -54,6 +58,88 @@ class IntermediateRepresentation():
         self.leaves = {}
         self.edges = []
         self.edge_attributes = {}
+        # bumped by every method which changes the graph
+        self.__version = 0
+        # backend specific executables lowered from this IR, the least recently used first
+        self.__executables = OrderedDict()
+        self.__executable_lock = Lock()
+        # results computed from the graph, e.g., traversal orders
+        self.__analyses = {}
+        self.__analysis_lock = RLock()
+
+    def copy(self) -> 'IntermediateRepresentation':
+        '''
+        Copy the graph and the list attributes of its vertices, so lowering the copy does not change this IR.
+        '''
+        ir = IntermediateRepresentation()
+        ir.dag = self.dag.copy()
+        for attr in ('qubits', 'params', 'pindex'):
+            if attr in ir.dag.vs.attributes():
+                ir.dag.vs[attr] = [list(x) if isinstance(x, list) else x for x in ir.dag.vs[attr]]
+        ir.qnum = self.qnum
+        ir.cnum = self.cnum
+        ir.leaves = dict(self.leaves)
+        ir.edges = list(self.edges)
+        ir.edge_attributes = {k: dict(v) for k, v in self.edge_attributes.items()}
+        return ir
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def _graph_changed(self):
+        self.__version += 1
+        self.clear_executables()
+        self.clear_analyses()
+
+    def _graph_stamp(self) -> Tuple[int, int, int]:
+        # the counts catch vertices and edges added or deleted through dag directly
+        return self.__version, self.dag.vcount(), self.dag.ecount()
+
+    def get_executable(self, key: Hashable, lower: Callable[['IntermediateRepresentation'], None]) -> 'IntermediateRepresentation':
+        '''
+        Return the executable cached under key, e.g., (backend, platform). If there is none,
+        lower a copy of this IR in place with lower and cache it. This IR itself is not changed.
+        The entries are tied to the version of the graph and at most max_executables are kept.
+        Changes made through the methods of this class are tracked, and so are vertices and edges
+        added or deleted through dag directly, but attribute edits through dag are not, call
+        clear_executables after them.
+        '''
+        stamp = self._graph_stamp()
+        with self.__executable_lock:
+            entry = self.__executables.get(key)
+            if entry is None or entry[0] != stamp:
+                exe = self.copy()
+                lower(exe)
+                entry = (stamp, exe)
+                self.__executables[key] = entry
+            self.__executables.move_to_end(key)
+            while len(self.__executables) > self.max_executables:
+                self.__executables.popitem(last=False)
+            return entry[1]
+
+    def clear_executables(self):
+        with self.__executable_lock:
+            self.__executables.clear()
+
+    def get_analysis(self, key: Hashable, compute: Callable[['IntermediateRepresentation'], Any]) -> Any:
+        '''
+        Return the result of compute(self) cached under key. The results should not be modified by the callers.
+        They are dropped when the graph is changed by the methods of this class or its vertices and edges are
+        added or deleted through dag directly. Attribute edits through dag are not tracked, call clear_analyses
+        after them.
+        '''
+        stamp = self._graph_stamp()
+        with self.__analysis_lock:
+            entry = self.__analyses.get(key)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, compute(self))
+                self.__analyses[key] = entry
+            return entry[1]
+
+    def clear_analyses(self):
+        with self.__analysis_lock:
+            self.__analyses.clear()
 
     @staticmethod
     def get_comparator(sym: str):
@@ -73,6 +159,7 @@ class IntermediateRepresentation():
             raise ValueError("Unknown comparator " + sym)
 
     def add_init_nodes(self, start: int, cnt: int, type: NodeType):
+        self._graph_changed()
         vcount = self.dag.vcount()
         self.dag.add_vertices(cnt + 1)
 
@@ -102,6 +189,7 @@ class IntermediateRepresentation():
         pass
 
     def add_op_node(self, gatename: str, params: List, qubits: List, clbits: List) -> int:
+        self._graph_changed()
         self.dag.add_vertices(1)
         index = self.dag.vcount() - 1
         self.dag.vs[index]['type'] = NodeType.op.value
@@ -126,6 +214,7 @@ class IntermediateRepresentation():
         return index
 
     def add_def_node(self, gatename: str, param_num: int, qubit_num: int, clbit_num: int):
+        self._graph_changed()
         self.dag.add_vertices(1)
         index = self.dag.vcount() - 1
         self.dag.vs[index]['type'] = NodeType.definition.value
@@ -142,6 +231,7 @@ class IntermediateRepresentation():
 
     def add_callee_node(self, gatename: str, params: List[Callable], qubits: List[int], 
                         clbits: List[int], param_idx: List[int], is_caller: bool = False) -> int:
+        self._graph_changed()
         self.dag.add_vertices(1)
         index = self.dag.vcount() - 1
         if is_caller:
@@ -175,6 +265,7 @@ class IntermediateRepresentation():
         '''
         A caller node may also be one callee node for another caller node, in which case, the node is added by add_callee_node.
         '''
+        self._graph_changed()
         self.dag.add_vertices(1)
         index = self.dag.vcount() - 1
         self.dag.vs[index]['type'] = NodeType.caller.value
@@ -201,11 +292,13 @@ class IntermediateRepresentation():
         return index
 
     def add_caller_matrix(self, node_index: int, matrix: np.ndarray, control_bits: int = 0, inverse: bool = False):
+        self._graph_changed()
         self.dag.vs[node_index]['matrix'] = matrix
         self.dag.vs[node_index]['ctrl_num'] = control_bits
         self.dag.vs[node_index]['inverse'] = inverse
 
     def add_unitary_node(self, gatename: str, matrix: np.ndarray, qubits: List[int], ctrl_num: int, inverse: bool) -> int:
+        self._graph_changed()
         self.dag.add_vertices(1)
         index = self.dag.vcount() - 1
         self.dag.vs[index]['type'] = NodeType.unitary.value
@@ -226,6 +319,7 @@ class IntermediateRepresentation():
         Only use this function when creating the IR dag.
         Otherwise, the vertices in leaves may change.
         '''
+        self._graph_changed()
         for i in clbits:
             leaf = self.leaves[f'c{i}']
             self.edges.append((leaf, node))
@@ -238,6 +332,7 @@ class IntermediateRepresentation():
         """
         Insert instructions into positions specified by gate ids.
         """
+        self._graph_changed()
         local_leaves = {}
         path_ends = {}
         for inst, physical_qubits in instructions:
@@ -282,6 +377,7 @@ class IntermediateRepresentation():
         Substitute only 1q or 2q paths. The in_map and out_map have the same size.
         This function does not remove nodes directly because igraph will change vids after deletion.
         """
+        self._graph_changed()
         node_set = set(nodes)
         in_map = {}
         in_conbit_map = {}
@@ -393,6 +489,7 @@ class IntermediateRepresentation():
         return True
 
     def remove_nodes(self, nodes: List[int], keep_edge: bool =False):
+        self._graph_changed()
         if nodes is None or len(nodes) == 0:
             return
         if keep_edge:
@@ -427,6 +524,7 @@ class IntermediateRepresentation():
         Add all the edges to the graph in one batch.
         Adding edges one by one in igraph is very slow.
         """
+        self._graph_changed()
         self.dag["qnum"] = self.qnum
         self.dag["cnum"] = self.cnum
         self.dag.add_edges(self.edges)
@@ -440,3 +538,52 @@ class IntermediateRepresentation():
             v["label"] = v["name"] + '_' + str(v.index)
         layout = g.layout(layout_name)
         plot(g, save_path, layout=layout, **kargs)
+
+def topological_sort_by_dfs(roots: List[int], graph: Graph, adjacency: Optional[List[List[int]]] = None):
+    '''
+    The reverse postorder of a depth first search from each root, visiting the successors in the order of
+    graph.neighbors, or of adjacency if it is given. The search keeps its own stack, so the depth of the graph
+    is not limited by the recursion limit.
+    '''
+    visited = set()
+    result = []
+    for root in roots:
+        stack = [(root, iter(adjacency[root] if adjacency is not None else graph.neighbors(root, mode='out')))]
+        while len(stack) > 0:
+            vidx, successors = stack[-1]
+            for s in successors:
+                if not s in visited:
+                    stack.append((s, iter(adjacency[s] if adjacency is not None else graph.neighbors(s, mode='out'))))
+                    break
+            else:
+                stack.pop()
+                result.append(vidx)
+                visited.add(vidx)
+    return result[::-1]
+
+def _out_adjacency(ir: IntermediateRepresentation) -> List[List[int]]:
+    return ir.get_analysis('out_adjacency', lambda ir: ir.dag.get_adjlist(mode='out'))
+
+def _main_thread_order(ir: IntermediateRepresentation) -> List[int]:
+    registers = ir.dag.vs.select(type = NodeType.register.value)
+    return topological_sort_by_dfs([node.index for node in registers], ir.dag, _out_adjacency(ir))
+
+def _definition_orders(ir: IntermediateRepresentation) -> Dict[str, List[int]]:
+    adjacency = _out_adjacency(ir)
+    orders = {}
+    for d in ir.dag.vs.select(type=NodeType.definition.value):
+        if d['name'] not in orders:
+            orders[d['name']] = topological_sort_by_dfs([d.index], ir.dag, adjacency)[1:]
+    return orders
+
+def main_thread_order(ir: IntermediateRepresentation) -> List[int]:
+    '''
+    The vertices reachable from the registers in topological order, cached on the IR.
+    '''
+    return ir.get_analysis('main_thread_order', _main_thread_order)
+
+def definition_orders(ir: IntermediateRepresentation) -> Dict[str, List[int]]:
+    '''
+    The callees of each definition in topological order, without the definition vertex, cached on the IR.
+    '''
+    return ir.get_analysis('definition_orders', _definition_orders)
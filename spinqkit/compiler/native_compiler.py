@@ -153,6 +153,6 @@ class NativeCompiler(Compiler):
 
         ir.build_dag()
 
-        manager = PassManager(level)
+        manager = PassManager(level, self.checker)
         manager.run(ir)
         return ir
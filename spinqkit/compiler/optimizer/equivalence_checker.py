@@ -0,0 +1,136 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Tuple, Union
+import warnings
+import numpy as np
+from ..ir import IntermediateRepresentation
+
+DEFAULT_COST_BUDGET = 1 << 28
+
+def random_product_states(qubit_num: int, num_states: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Random product states as a tensor with one axis per qubit and the state index as the last axis.
+    '''
+    states = np.ones((num_states,), dtype=complex)
+    for _ in range(qubit_num):
+        q = rng.normal(size=(num_states, 2)) + 1j * rng.normal(size=(num_states, 2))
+        q /= np.linalg.norm(q, axis=1, keepdims=True)
+        states = np.einsum('...n,nb->...bn', states, q)
+    return states
+
+def random_haar_states(qubit_num: int, num_states: int, rng: np.random.Generator) -> np.ndarray:
+    states = rng.normal(size=(2 ** qubit_num, num_states)) + 1j * rng.normal(size=(2 ** qubit_num, num_states))
+    states /= np.linalg.norm(states, axis=0, keepdims=True)
+    return states.reshape((2,) * qubit_num + (num_states,))
+
+def zero_states(qubit_num: int) -> np.ndarray:
+    states = np.zeros((2,) * qubit_num + (1,), dtype=complex)
+    states[(0,) * qubit_num] = 1.0
+    return states
+
+class EquivalenceChecker(object):
+    '''
+    Check that an optimized IR implements the same circuit as the original one, by simulating both
+    on a batch of random input states and comparing the output states up to one global phase.
+    state_kind is 'product' or 'haar'. With zero_state_only, only the |0...0> input is compared,
+    which is what the passes assuming that input preserve.
+    A check costs about num_states * 2^qnum * gates. The number of states is reduced to fit cost_budget,
+    and the check is skipped with a warning if a single state does not fit.
+    '''
+    def __init__(self, num_states: int = 4, state_kind: str = 'product', cost_budget: int = DEFAULT_COST_BUDGET,
+                 atol: float = 1e-6, seed: Union[None, int, np.random.Generator] = None):
+        if state_kind not in ('product', 'haar'):
+            raise ValueError('state_kind should be product or haar.')
+        self.num_states = max(1, num_states)
+        self.state_kind = state_kind
+        self.cost_budget = cost_budget
+        self.atol = atol
+        self.rng = np.random.default_rng(seed)
+
+    def _operations(self, ir: IntermediateRepresentation) -> Optional[List]:
+        from spinqkit.backend.statevector_util import flatten_ir, remove_terminal_measurements
+        try:
+            return remove_terminal_measurements(flatten_ir(ir))
+        except ValueError:
+            return None
+
+    def input_states(self, qubit_num: int, num_states: int, zero_state_only: bool = False) -> np.ndarray:
+        if zero_state_only:
+            return zero_states(qubit_num)
+        if self.state_kind == 'haar':
+            return random_haar_states(qubit_num, num_states, self.rng)
+        return random_product_states(qubit_num, num_states, self.rng)
+
+    def affordable_states(self, qubit_num: int, gate_num: int, zero_state_only: bool = False) -> int:
+        '''
+        The number of input states that fits the cost budget, 0 if the check should be skipped.
+        '''
+        per_state = (2 ** qubit_num) * max(1, gate_num)
+        wanted = 1 if zero_state_only else self.num_states
+        if self.cost_budget is None:
+            return wanted
+        return min(wanted, self.cost_budget // per_state)
+
+    def simulate(self, ops: List, qubit_num: int, states: np.ndarray) -> np.ndarray:
+        from spinqkit.backend.statevector_util import simulate_operations
+        return simulate_operations(ops, qubit_num, states).reshape(2 ** qubit_num, -1)
+
+    def compare(self, expected: np.ndarray, actual: np.ndarray) -> bool:
+        overlaps = np.einsum('ij,ij->j', expected.conj(), actual)
+        if not np.allclose(np.abs(overlaps), 1.0, atol=self.atol):
+            return False
+        # the global phase should be the same for every input
+        return bool(np.allclose(overlaps, overlaps[0], atol=self.atol))
+
+    def reference(self, original: IntermediateRepresentation, zero_state_only: bool = False,
+                  repeats: int = 1) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        '''
+        Sample the input states and simulate the original IR once, for repeats later comparisons.
+        Return None if the check is skipped because of the cost budget or mid-circuit measurements.
+        '''
+        qubit_num = original.dag['qnum']
+        ops = self._operations(original)
+        if ops is None:
+            warnings.warn('The equivalence check is skipped for a circuit with mid-circuit measurements.')
+            return None
+        num_states = self.affordable_states(qubit_num, len(ops) * (repeats + 1), zero_state_only)
+        if num_states <= 0:
+            warnings.warn('The equivalence check is skipped since it exceeds the cost budget.')
+            return None
+        states = self.input_states(qubit_num, num_states, zero_state_only)
+        return states, self.simulate(ops, qubit_num, states)
+
+    def matches(self, reference: Tuple[np.ndarray, np.ndarray], optimized: IntermediateRepresentation) -> bool:
+        ops = self._operations(optimized)
+        if ops is None:
+            return False
+        states, expected = reference
+        return self.compare(expected, self.simulate(ops, optimized.dag['qnum'], states))
+
+    def check(self, original: IntermediateRepresentation, optimized: IntermediateRepresentation,
+              zero_state_only: bool = False) -> Optional[bool]:
+        '''
+        Return whether the two IRs agree on the sampled inputs, or None if the check was skipped.
+        '''
+        reference = self.reference(original, zero_state_only)
+        if reference is None:
+            return None
+        return self.matches(reference, optimized)
+
+def check_equivalence(original: IntermediateRepresentation, optimized: IntermediateRepresentation,
+                      num_states: int = 4, state_kind: str = 'product', zero_state_only: bool = False,
+                      cost_budget: int = DEFAULT_COST_BUDGET, seed: Union[None, int, np.random.Generator] = None) -> Optional[bool]:
+    checker = EquivalenceChecker(num_states, state_kind, cost_budget, seed=seed)
+    return checker.check(original, optimized, zero_state_only)
@@ -13,15 +13,18 @@
 # limitations under the License.
 
 from ..ir import IntermediateRepresentation
+from spinqkit.model import OptimizerError
 from .cancel_redundant_gates import CancelRedundantGates
 from .collapse_single_qubit_gates import CollapseSingleQubitGates
 from .collapse_two_qubit_gates import CollapseTwoQubitGates
 from .quantum_basis_state_optimization import ConstantsStateOptimization
 from .quantum_pure_state_optimization import PureStateOnU
+from .equivalence_checker import EquivalenceChecker
 
 class PassManager(object):
-    def __init__(self, level: int):
+    def __init__(self, level: int, checker: EquivalenceChecker = None):
         self.passes = []
+        self.checker = checker
         if level == 1:
             self.passes.append(CancelRedundantGates())
             self.passes.append(CollapseSingleQubitGates())
@@ -39,6 +42,34 @@ class PassManager(object):
     def append(self, optimizer):
         self.passes.append(optimizer)
 
+    def configure_verification(self, checker: EquivalenceChecker = None):
+        '''
+        Compare the IR after each pass with the input IR by the checker, None disables the check.
+        The passes before the first one which does not preserve the unitary are compared on random input states,
+        that pass and the later ones only on the |0...0> input. OptimizerError is raised by the first pass
+        that changes the circuit.
+        '''
+        self.checker = checker
+
     def run(self, ir: IntermediateRepresentation):
-        for optimizer in self.passes:
+        if self.checker is None or len(self.passes) == 0:
+            for optimizer in self.passes:
+                optimizer.run(ir)
+            return
+        # the passes before the first state dependent one are compared on random inputs,
+        # the rest only on the |0...0> input which the state dependent passes preserve
+        first_dependent = len(self.passes)
+        for i, optimizer in enumerate(self.passes):
+            if not getattr(optimizer, 'preserves_unitary', True):
+                first_dependent = i
+                break
+        random_reference, zero_reference = None, None
+        if first_dependent > 0:
+            random_reference = self.checker.reference(ir, False, first_dependent)
+        if first_dependent < len(self.passes):
+            zero_reference = self.checker.reference(ir, True, len(self.passes) - first_dependent)
+        for i, optimizer in enumerate(self.passes):
             optimizer.run(ir)
+            reference = random_reference if i < first_dependent else zero_reference
+            if reference is not None and not self.checker.matches(reference, ir):
+                raise OptimizerError('The circuit is changed by the pass ' + type(optimizer).__name__ + '.')
@@ -34,6 +34,8 @@ from spinqkit.model import S, Sd, T, Td, H, X, Y, Z, CX, CY, CZ, SWAP, CCX
 
 
 class ConstantsStateOptimization(object):
+    # the pass assumes the |0...0> input, so it keeps the output state rather than the unitary
+    preserves_unitary = False
     controlled_gates = {CX.label, CY.label, CZ.label, CCX.label} 
     nothing_gates = {S, T, Sd, Td}
     swap_rules = {
@@ -38,6 +38,8 @@ from spinqkit.model import H, X, Y, Z, S, Sd, T, Td, P, Rx, Ry, Rz, CX, CY, CZ,
 _CHOP_THRESHOLD = 1e-15
 
 class PureStateOnU(object):
+    # the pass assumes the |0...0> input, so it keeps the output state rather than the unitary
+    preserves_unitary = False
     single_gates = {X.label, Y.label, Z.label, H.label, S.label, Sd.label, T.label, Td.label, P.label, Rx.label, Ry.label, Rz.label}
     controlled_gates = {CX.label, CY.label, CZ.label, CCX.label} 
 
@@ -22,5 +22,6 @@ class QiskitCompiler(Compiler):
     def compile(self, qc: QuantumCircuit, level: int):
         circ = qiskit_to_spinq(qc)
         native = NativeCompiler()
+        native.configure_verification(self.checker)
         ir = native.compile(circ, level)
         return ir
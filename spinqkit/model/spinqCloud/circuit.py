@@ -14,7 +14,7 @@
 
 from typing import List, Dict, Set
 from igraph import Graph
-from spinqkit.compiler.ir import NodeType, IntermediateRepresentation
+from spinqkit.compiler.ir import NodeType, IntermediateRepresentation, topological_sort_by_dfs, main_thread_order, definition_orders
 from ..exceptions import CircuitOperationParsingError, CircuitOperationValidationError
 from .gate import *
 from .platform import *
@@ -72,6 +72,37 @@ class Circuit:
     def to_dict(self):
         return {"operations": [o.to_dict() for o in self._operations], "definitions": []}
 
+    def to_compact_dict(self):
+        '''
+        The operations as parallel arrays. Each distinct gate is listed once in "gates" and referenced by its index,
+        and the qubits and arguments of all the operations are concatenated, the ones of operation i being
+        qubits[qubitOffsets[i]:qubitOffsets[i+1]] and arguments[argumentOffsets[i]:argumentOffsets[i+1]].
+        '''
+        gates = []
+        gate_index = {}
+        gate_refs = []
+        time_slots = []
+        native = []
+        qubits = []
+        qubit_offsets = [0]
+        arguments = []
+        argument_offsets = [0]
+        for o in self._operations:
+            key = (o.gate.gname, o.gate.gtag)
+            if key not in gate_index:
+                gate_index[key] = len(gates)
+                gates.append(o.gate.to_dict())
+            gate_refs.append(gate_index[key])
+            time_slots.append(o.time_slot)
+            native.append(1 if o.nativeOperation else 0)
+            qubits.extend(o.qubits)
+            qubit_offsets.append(len(qubits))
+            arguments.extend(o.arguments)
+            argument_offsets.append(len(arguments))
+        return {"encoding": "compact", "gates": gates, "gateIndices": gate_refs, "timeSlots": time_slots,
+                "nativeOperations": native, "qubits": qubits, "qubitOffsets": qubit_offsets,
+                "arguments": arguments, "argumentOffsets": argument_offsets, "definitions": []}
+
 def _count_qubits(vs):
         count = 0
         for v in vs:
@@ -185,9 +216,6 @@ def _vertex_to_circuit_operation(circuitboard, name, qubits, arguments) -> Circu
     else:
         raise CircuitOperationParsingError("Gate with tag = " + gate.gtag + " is not support by spinq cloud.")
 
-# customized operation dictionary
-customized_op = {}
-
 def _transfer_qubits(global_qlist, local_qlist):
     return [global_qlist[x] for x in local_qlist]
 
@@ -195,59 +223,81 @@ def _transfer_arguments(global_arguments, local_arguments, func):
     args = [global_arguments[x] for x in local_arguments]
     return func(*args)
 
-def _dfs(root_index: int, graph: Graph, visited: Set, result: List):
-    successors = graph.neighbors(root_index, mode='out')
-    for s in successors:
-        if not s in visited:
-            _dfs(s, graph, visited, result)
-    result.append(root_index)
-    visited.add(root_index)
-
-def topological_sort_by_dfs(roots: List[int], graph: Graph):
-    visited = set()
-    result = []
-    for vidx in roots:
-        _dfs(vidx, graph, visited, result)
-    return result[::-1]
-
-def _expand_customized_gate(def_name: str, g: Graph):
-    def_v = g.vs.find(def_name, type=NodeType.definition.value)
-    callee_idx_list = topological_sort_by_dfs([def_v.index], g)
-    callee_idx_list = callee_idx_list[1:]
-    sorted_callee_list = [g.vs[idx] for idx in callee_idx_list ]
-    return sorted_callee_list
+# the argument index map of a parameter which takes all the arguments of the caller
+ALL_ARGUMENTS = -1
+
+class _ExpandedCallee:
+    '''
+    A callee of a definition with what converting it needs, read once from the graph.
+    arg_indices has one item for each parameter: None for a constant, ALL_ARGUMENTS, or the indices
+    of the caller arguments passed to the parameter function.
+    '''
+    __slots__ = ('index', 'type', 'name', 'qubits', 'params', 'arg_indices')
+
+    def __init__(self, index: int, type: int, name: str, qubits: List, params: List, arg_indices: List):
+        self.index = index
+        self.type = type
+        self.name = name
+        self.qubits = qubits
+        self.params = params
+        self.arg_indices = arg_indices
+
+def _argument_indices(params: List, pindex: List) -> List:
+    arg_indices = []
+    start = 0
+    for p in params:
+        if isinstance(p, (int, float)):
+            arg_indices.append(None)
+        elif len(pindex) == 1 and pindex[0] == -1:
+            arg_indices.append(ALL_ARGUMENTS)
+        else:
+            arg_count = p.__code__.co_argcount
+            arg_indices.append(tuple(pindex[start:start + arg_count]))
+            start += arg_count
+    return arg_indices
+
+def _expand_customized_gate(callee_idx_list: List[int], g: Graph) -> List[_ExpandedCallee]:
+    has_params = 'params' in g.vs.attributes()
+    expanded = []
+    for idx in callee_idx_list:
+        callee = g.vs[idx]
+        params = callee['params'] if has_params else None
+        if params is not None and len(params) > 0:
+            arg_indices = _argument_indices(params, callee['pindex'])
+        else:
+            params, arg_indices = [], []
+        expanded.append(_ExpandedCallee(idx, callee['type'], callee['name'], callee['qubits'], params, arg_indices))
+    return expanded
+
+def _expand_customized_gates(ir: IntermediateRepresentation) -> Dict[str, List[_ExpandedCallee]]:
+    return {name: _expand_customized_gate(order, ir.dag) for name, order in definition_orders(ir).items()}
+
+def customized_gate_expansions(ir: IntermediateRepresentation) -> Dict[str, List[_ExpandedCallee]]:
+    '''
+    The callees of every definition in the IR in topological order, cached on the IR.
+    '''
+    return ir.get_analysis('spinq_cloud_expansions', _expand_customized_gates)
 
 def _customized_vertex_to_circuit_operation(circuitboard, gatename, vindex, global_qubits, global_arguments, 
-                                            swap_fixes, gate_updates, graph) -> List[CircuitOperation]:    
+                                            swap_fixes, gate_updates, expansions) -> List[CircuitOperation]:    
 
-    callee_list = customized_op[gatename]
+    callee_list = expansions[gatename]
     oplist = []
     for callee in callee_list:
-        sub_qubits = callee['qubits']
-        final_qubits = _transfer_qubits(global_qubits, sub_qubits)
+        final_qubits = _transfer_qubits(global_qubits, callee.qubits)
         final_arguments = []
-        if callee['params'] is not None and len(callee['params']) > 0:
-            start = 0
-            for p in callee['params']:
-                if isinstance(p, (int, float)):
-                    final_arguments.append(p)
-                else:
-                    if len(callee['pindex']) == 1 and callee['pindex'][0] == -1:
-                        final_arg = p(global_arguments)
-                    else:
-                        local_args = []
-                        arg_count = p.__code__.co_argcount
-                        local_args = [] if arg_count == 0 else callee['pindex'][start:start + arg_count]
-                        start += arg_count
-                        arg_inputs = []
-                    
-                        for x in local_args:
-                            if x >= len(global_arguments):
-                                raise ValueError("Global args with idx = " + str(x) + " does not exists.")
-                            else:
-                                arg_inputs.append(global_arguments[x])
-                        final_arg = p(*arg_inputs)
-                    final_arguments.append(final_arg)
+        for p, arg_indices in zip(callee.params, callee.arg_indices):
+            if arg_indices is None:
+                final_arguments.append(p)
+            elif arg_indices == ALL_ARGUMENTS:
+                final_arguments.append(p(global_arguments))
+            else:
+                arg_inputs = []
+                for x in arg_indices:
+                    if x >= len(global_arguments):
+                        raise ValueError("Global args with idx = " + str(x) + " does not exists.")
+                    arg_inputs.append(global_arguments[x])
+                final_arguments.append(p(*arg_inputs))
         if isinstance(vindex, tuple):
             gate_index = (*vindex, callee.index)
         else:
@@ -259,14 +309,11 @@ def _customized_vertex_to_circuit_operation(circuitboard, gatename, vindex, glob
         if gate_updates is not None and gate_index in gate_updates:
             final_qubits = gate_updates[gate_index]
 
-        if callee["type"] == NodeType.caller.value:
-            callername = callee["name"]
-            if callername not in customized_op:
-                customized_op[callername] = _expand_customized_gate(callername, graph)
-            result_list = _customized_vertex_to_circuit_operation(circuitboard, callername, gate_index, final_qubits, final_arguments, swap_fixes, gate_updates, graph)
+        if callee.type == NodeType.caller.value:
+            result_list = _customized_vertex_to_circuit_operation(circuitboard, callee.name, gate_index, final_qubits, final_arguments, swap_fixes, gate_updates, expansions)
             oplist.extend(result_list)
         else:
-            op = _vertex_to_circuit_operation(circuitboard, callee["name"], final_qubits, final_arguments)
+            op = _vertex_to_circuit_operation(circuitboard, callee.name, final_qubits, final_arguments)
             oplist.append(op)
     return oplist
 
@@ -280,11 +327,7 @@ def graph_to_circuit(ir: IntermediateRepresentation,
                     platform:Optional[Platform]=None, 
                     swap_fixes: Optional[List]=None, 
                     gate_updates:Optional[List]=None) -> Circuit:
-    global customized_op
-
-    registers = ir.dag.vs.select(type = NodeType.register.value)
-    reg_indices = [node.index for node in registers]
-    main_thread_vidx_list = topological_sort_by_dfs(reg_indices, ir.dag)
+    main_thread_vidx_list = main_thread_order(ir)
     main_thread_vx_list = [ir.dag.vs[vidx] for vidx in main_thread_vidx_list]
 
     # get total qubit_size
@@ -315,12 +358,9 @@ def graph_to_circuit(ir: IntermediateRepresentation,
         elif v["type"] == NodeType.caller.value:
             # customized gate
             gatename = v["name"]
-            if gatename not in customized_op:
-                customized_op[gatename] = _expand_customized_gate(gatename, ir.dag)
-            
             global_qubits = [logical_to_physical[q] for q in v['qubits']]
             global_arguments = v['params']
-            oplist = _customized_vertex_to_circuit_operation(circuitboard, gatename, v.index, global_qubits, global_arguments, swap_fixes, gate_updates, ir.dag)
+            oplist = _customized_vertex_to_circuit_operation(circuitboard, gatename, v.index, global_qubits, global_arguments, swap_fixes, gate_updates, customized_gate_expansions(ir))
 
             if platform is not None:
                 for op in oplist:
@@ -328,7 +368,5 @@ def graph_to_circuit(ir: IntermediateRepresentation,
                         operations.append(op)
             else:
                 operations.extend(oplist)
-    # reset customized_op
-    customized_op = {}            
     return Circuit(operations=operations)
 
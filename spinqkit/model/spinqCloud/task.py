@@ -14,9 +14,12 @@
 
 import json
 import time, datetime
-from typing import Optional
+from typing import Callable, Optional
+from threading import Event
+from concurrent.futures import CancelledError
 from .circuit import Circuit
 from spinqkit.backend.client.spinq_cloud_client import SpinQCloudClient
+from spinqkit.backend.backend_util import map_results
 from ..exceptions import *
 from math import log
 import enum
@@ -77,6 +80,9 @@ class Task:
         self._task_code = None
         self._status = None
         self._created_time = None
+        # the run result from the cloud, kept once it is retrieved
+        self._run = None
+        self._result_listener = None
 
     @property
     def platform_code(self):
@@ -84,7 +90,7 @@ class Task:
 
     @property
     def circuit(self):
-        return self.circuit
+        return self._circuit
 
     @property
     def task_code(self):
@@ -110,6 +116,17 @@ class Task:
     def status(self):
         return self._status
 
+    @property
+    def active_bits(self):
+        return self._active_bits
+
+    @property
+    def completed(self) -> bool:
+        '''
+        Whether the result is already retrieved, so get_result returns without a request.
+        '''
+        return self._run is not None
+
     def set_api_client(self, api_client: SpinQCloudClient):
         self._api_client = api_client
 
@@ -139,6 +156,18 @@ class Task:
     def set_created_time(self, created_time: Optional[datetime.datetime]):
         self._created_time = created_time
 
+    def set_run_result(self, run: dict):
+        '''
+        Complete the task with a run result of the cloud, e.g., a cached one.
+        '''
+        self._run = run
+
+    def set_result_listener(self, listener: Optional[Callable[[dict], None]]):
+        '''
+        listener is called with the run result when it is retrieved from the cloud.
+        '''
+        self._result_listener = listener
+
     def get_status(self):
         res = self._api_client.task_status(self._task_code)
         if res:
@@ -147,12 +176,17 @@ class Task:
         else:
             raise SpinQCloudServerError("Retrieve task status failed")
 
-    def get_result(self, hanging:bool = True, timeout:Optional[int] = None):
+    def get_result(self, hanging:bool = True, timeout:Optional[int] = None, cancel_event: Optional[Event] = None):
+        '''
+        If cancel_event is set while waiting, CancelledError is raised.
+        '''
         start_time = datetime.datetime.now()
         if timeout is not None:
             end_time = start_time + datetime.timedelta(seconds=timeout)
         count = 0
         while (timeout is None or datetime.datetime.now() < end_time):
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
             count = count + 1
             # print("Check result " + str(count) + " times.")
             try:
@@ -160,7 +194,10 @@ class Task:
                 return res
             except TaskStatusError as eo:
                 if hanging:
-                    time.sleep(5)
+                    if cancel_event is not None:
+                        cancel_event.wait(5)
+                    else:
+                        time.sleep(5)
                     continue
                 else:
                     raise Exception(str(eo))
@@ -169,17 +206,15 @@ class Task:
         raise RequestTimeoutError("Find result timeout.")
 
     def _get_result(self):
+        if self._run is not None:
+            return self._module_map(self._run["module"])
         res = self._api_client.task_result(self._task_code)
         res_entity = json.loads(res.content)
         if res.status_code == 200:
-            module_list = res_entity["run"]["module"]
-            bitnum = int(log(len(module_list), 2))
-            module_map = {}
-            for idx, m in enumerate(module_list):
-                k = intToBinary(idx, bitnum)
-                k = phy_to_log_model_key_mapping(k, self._phy_to_log_mapping)
-                module_map[k] = m
-            return module_map
+            self._run = res_entity["run"]
+            if self._result_listener is not None:
+                self._result_listener(self._run)
+            return self._module_map(self._run["module"])
         elif res.status_code == 202:
             raise SpinQCloudServerError("Task failed while processing.")
         elif res.status_code == 206:
@@ -192,6 +227,26 @@ class Task:
             else:
                 raise SpinQCloudServerError("Retrieve task status failed")
 
+    def _module_map(self, module_list):
+        bitnum = int(log(len(module_list), 2))
+        # bit i of a reading is measured on physical qubit i, whose logical qubit is phy_to_log_mapping[i]
+        qubit_mapping = [None] * bitnum
+        for i in range(bitnum):
+            log_bit = self._phy_to_log_mapping.get(i)
+            if log_bit is None or not 0 <= log_bit < bitnum or qubit_mapping[log_bit] is not None:
+                qubit_mapping = None
+                break
+            qubit_mapping[log_bit] = i
+        module_map = {}
+        if qubit_mapping is None:
+            # the mapping does not permute the bits, map the readings one by one
+            for idx, m in enumerate(module_list):
+                module_map[phy_to_log_model_key_mapping(intToBinary(idx, bitnum), self._phy_to_log_mapping)] = m
+            return module_map
+        for idx, m in enumerate(map_results(module_list, qubit_mapping).tolist()):
+            module_map[intToBinary(idx, bitnum)] = m
+        return module_map
+
     def to_dict(self):
         task_dict = {
             "tcode": self._task_code,
@@ -206,7 +261,10 @@ class Task:
         }
         return task_dict
 
-    def to_request(self):
+    def to_request(self, compact: bool = False):
+        '''
+        With compact, the circuit is encoded by Circuit.to_compact_dict instead of Circuit.to_dict.
+        '''
         task_dict = {
             "tname": self.task_name,
             "bitNum": self._bitnum,
@@ -216,7 +274,7 @@ class Task:
             "proceedNow": self._processNow,
             "platformCode": self._platform_code,
             "description": self.description,
-            "circuit": self._circuit.to_dict(),
+            "circuit": self._circuit.to_compact_dict() if compact else self._circuit.to_dict(),
             "activeBits": self._active_bits,
             "shots": self._shots
         }
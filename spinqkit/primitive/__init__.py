@@ -14,8 +14,9 @@
 from .amplitude_amplification import AmplitudeAmplification
 from .phase_estimation import PhaseEstimation
 from .qft import QFT
-from .pauli_builder import PauliBuilder
+from .pauli_builder import PauliBuilder, MeasurementBasisBuilder
 from .reciprocal import Reciprocal
 from .vector_encoding import generate_vector_encoding
 from .power import generate_power_gate
-from .pauli_expectation import calculate_pauli_expectation, generate_hamiltonian_matrix
\ No newline at end of file
+from .pauli_expectation import calculate_pauli_expectation, generate_hamiltonian_matrix, calculate_state_expectation, apply_pauli_sum, \
+    calculate_pauli_sum_expectation, group_qubit_wise_commuting
\ No newline at end of file
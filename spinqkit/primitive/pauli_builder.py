@@ -31,4 +31,20 @@ class PauliBuilder(GateBuilder):
                 self.append(I, [i])
             else:
                 raise ValueError('The input string is not a Pauli string')
-        
\ No newline at end of file
+
+class MeasurementBasisBuilder(GateBuilder):
+    '''
+    Rotate every qubit into the basis of a (merged) Pauli string, so a Z measurement reads out X, Y or Z.
+    '''
+    def __init__(self, basis_string: str):
+        super().__init__(len(basis_string))
+        for i, ch in enumerate(basis_string):
+            if ch.capitalize() == 'X':
+                self.append(H, [i])
+            elif ch.capitalize() == 'Y':
+                self.append(Sd, [i])
+                self.append(H, [i])
+            elif ch.capitalize() in ['Z', 'I']:
+                self.append(I, [i])
+            else:
+                raise ValueError('The input string is not a Pauli string')
@@ -11,44 +11,71 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Dict, List
+from typing import Dict, List, Tuple, Union
 from spinqkit import I, Z, X, Y
+from spinqkit.backend.sampling import probabilities_to_array
 import numpy as np
 from functools import reduce
 import itertools
 
-def calculate_pauli_expectation(pauli_string: str, probabilities: Dict) -> float:
-    imat = I.matrix()
-    zmat = Z.matrix()
-    zerovec = np.array([[1], [0]])
-    onevec = np.array([[0], [1]])
+def _measurement_mask(pauli_string: str) -> int:
+    '''
+    After the rotation into the measurement basis, every non-identity Pauli is read out as Z.
+    '''
+    xmask, zmask, _ = _pauli_masks(pauli_string)
+    return xmask | zmask
 
-    umat = 1
-    for ch in pauli_string:
-        if ch.capitalize() in ['X', 'Y', 'Z']:
-            umat = np.kron(zmat, umat)
-        elif ch.capitalize() == 'I':
-            umat = np.kron(imat, umat)
-        else:
-            raise ValueError('The input string is not a Pauli string')
+def calculate_pauli_expectation(pauli_string: str, probabilities: Union[Dict, np.ndarray]) -> float:
+    '''
+    The probabilities are measured in the basis of the Pauli string.
+    The expectation is the probability sum signed by the parity of the bits under the non-identity positions.
+    '''
+    prob_array = probabilities_to_array(probabilities)
+    if len(prob_array) != 2 ** len(pauli_string):
+        raise ValueError('The probabilities do not match the Pauli string.')
+    indices = np.arange(len(prob_array), dtype=np.uint64)
+    signs = 1.0 - 2.0 * _parity(indices & np.uint64(_measurement_mask(pauli_string)))
+    return float(signs @ prob_array)
 
+def calculate_pauli_sum_expectation(pauli_string_list: List, probabilities: Union[Dict, np.ndarray], chunk_size: int = 1 << 22) -> float:
+    '''
+    Calculate the expectation of qubit-wise commuting (pauli string, coeff) terms from the probabilities measured 
+    in their shared basis. All the terms are evaluated together in bounded chunks.
+    '''
+    prob_array = probabilities_to_array(probabilities)
+    if len(prob_array) != 2 ** len(pauli_string_list[0][0]):
+        raise ValueError('The probabilities do not match the Pauli strings.')
+    indices = np.arange(len(prob_array), dtype=np.uint64)
+    masks = np.array([_measurement_mask(pstr) for pstr, _ in pauli_string_list], dtype=np.uint64)
+    coeffs = np.array([coeffi for _, coeffi in pauli_string_list])
+    rows = max(1, chunk_size // len(prob_array))
     expect_value = 0.0
-    for bit_string in probabilities.keys():
-        dlist = []
-        vec = 1
-        for digit in bit_string:
-            if digit == '0':
-                vec = np.kron(zerovec, vec)
-            else:
-                vec = np.kron(onevec, vec)
+    for start in range(0, len(masks), rows):
+        signs = 1.0 - 2.0 * _parity(indices[np.newaxis, :] & masks[start:start + rows, np.newaxis])
+        expect_value += np.real(coeffs[start:start + rows] @ (signs @ prob_array))
+    return float(expect_value)
 
-        prod = umat.dot(vec)
-        if np.allclose(vec, prod):
-            expect_value += 1 * probabilities[bit_string]
+def group_qubit_wise_commuting(pauli_string_list: List) -> List[Tuple[str, List]]:
+    '''
+    Partition (pauli string, coeff) terms into qubit-wise commuting groups, so each group can be measured 
+    with one basis-rotated circuit. Return a list of (basis string, terms).
+    The terms are placed greedily with the ones acting on the most qubits first.
+    '''
+    order = sorted(range(len(pauli_string_list)), 
+                   key=lambda k: -sum(ch.capitalize() != 'I' for ch in pauli_string_list[k][0]))
+    bases = []
+    groups = []
+    for k in order:
+        pauli_string = pauli_string_list[k][0].upper()
+        for gidx, basis in enumerate(bases):
+            if all(a == 'I' or b == 'I' or a == b for a, b in zip(basis, pauli_string)):
+                bases[gidx] = ''.join(b if a == 'I' else a for a, b in zip(basis, pauli_string))
+                groups[gidx].append(pauli_string_list[k])
+                break
         else:
-            expect_value += -1 * probabilities[bit_string]
-    
-    return expect_value
+            bases.append(pauli_string)
+            groups.append([pauli_string_list[k]])
+    return list(zip(bases, groups))
 
 def generate_hamiltonian_matrix(pauli_string_list: List):
     imat = I.matrix()
@@ -72,3 +99,81 @@ def generate_hamiltonian_matrix(pauli_string_list: List):
                 umat.append(xmat)
         ham_mat += coeffi * reduce(np.kron, umat)
     return ham_mat
+
+def _pauli_masks(pauli_string: str) -> Tuple[int, int, int]:
+    '''
+    Return the X mask, the Z mask and the number of Y of a Pauli string.
+    The first character acts on qubit 0, which is the most significant bit of a basis state index.
+    '''
+    qubit_num = len(pauli_string)
+    xmask = 0
+    zmask = 0
+    ycount = 0
+    for i, ch in enumerate(pauli_string):
+        bit = 1 << (qubit_num - i - 1)
+        c = ch.capitalize()
+        if c == 'X':
+            xmask |= bit
+        elif c == 'Z':
+            zmask |= bit
+        elif c == 'Y':
+            xmask |= bit
+            zmask |= bit
+            ycount += 1
+        elif c != 'I':
+            raise ValueError('The input string is not a Pauli string')
+    return xmask, zmask, ycount
+
+def _parity(values: np.ndarray) -> np.ndarray:
+    values = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        values ^= values >> np.uint64(shift)
+    return values & np.uint64(1)
+
+def _check_state(state: np.ndarray, pauli_string_list: List) -> Tuple[np.ndarray, int]:
+    state = np.asarray(state, dtype=np.complex128).ravel()
+    qubit_num = len(pauli_string_list[0][0])
+    if len(state) != 2 ** qubit_num:
+        raise ValueError('The state vector does not match the Pauli strings.')
+    return state, qubit_num
+
+def apply_pauli_sum(state: np.ndarray, pauli_string_list: List) -> np.ndarray:
+    '''
+    Apply a Hamiltonian given by a list of (pauli string, coeff) to a state vector without building its matrix.
+    '''
+    state, qubit_num = _check_state(state, pauli_string_list)
+    indices = np.arange(2 ** qubit_num, dtype=np.uint64)
+    result = np.zeros_like(state)
+    for pauli_string, coeffi in pauli_string_list:
+        xmask, zmask, ycount = _pauli_masks(pauli_string)
+        # P|b> = i^ycount * (-1)^parity(b & zmask) |b ^ xmask>
+        source = indices ^ np.uint64(xmask)
+        signs = 1.0 - 2.0 * _parity(source & np.uint64(zmask))
+        result += (coeffi * (1j ** ycount)) * signs * state[source.astype(np.intp)]
+    return result
+
+def calculate_state_expectation(state: np.ndarray, pauli_string_list: List, chunk_size: int = 1 << 22) -> float:
+    '''
+    Calculate <psi|H|psi> for a Hamiltonian given by a list of (pauli string, coeff) directly from the state vector.
+    Terms with the same X mask share the same amplitude products, and their signs are evaluated together in chunks.
+    '''
+    state, qubit_num = _check_state(state, pauli_string_list)
+    indices = np.arange(2 ** qubit_num, dtype=np.uint64)
+
+    groups = {}
+    for pauli_string, coeffi in pauli_string_list:
+        xmask, zmask, ycount = _pauli_masks(pauli_string)
+        groups.setdefault(xmask, []).append((zmask, coeffi * (1j ** ycount)))
+
+    rows = max(1, chunk_size // len(state))
+    expect_value = 0.0
+    for xmask, terms in groups.items():
+        prod = np.conj(state[(indices ^ np.uint64(xmask)).astype(np.intp)]) * state
+        zmasks = np.array([t[0] for t in terms], dtype=np.uint64)
+        coeffs = np.array([t[1] for t in terms], dtype=np.complex128)
+        for start in range(0, len(terms), rows):
+            zpart = zmasks[start:start + rows]
+            signs = 1.0 - 2.0 * _parity(indices[np.newaxis, :] & zpart[:, np.newaxis])
+            expect_value += np.real(coeffs[start:start + rows] @ (signs @ prod))
+    return float(expect_value)
+
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from spinqkit.compiler.ir import NodeType, Comparator
+from spinqkit.compiler.ir import NodeType, Comparator, definition_orders
 from spinqkit import SWAP, CCX, U, CP
 from math import pi
 import random
@@ -158,13 +158,9 @@ def _vertex_to_node(v):
 # final global params and qubits of these operations are calculated based on real params get by the caller of this customized gate
 # @params: [ir] - circuit ir, used to find operations in gate definition
 # @params: [caller] - caller node of this customized gate definition
-# @params: [sorted_vidx_list] - graph vertex indexes after topological sorting, used to sort customized gate operations
-# @return: [vnode_list] - a list of circuit layer nodes in called order (sorted by bfs)
-def _extend_customized_gate(ir, caller, sorted_vidx_list):
-    def_v = ir.dag.vs.find(caller['name'], type=2)
-    vidx_list, _, _ = ir.dag.bfs(def_v.index)
-    vidx_list = vidx_list[1:] # remove definition itself
-    vidx_list = [vidx for vidx in sorted_vidx_list if vidx in vidx_list]
+# @return: [vnode_list] - a list of circuit layer nodes in called order (sorted by topology, shared with the cloud conversion)
+def _extend_customized_gate(ir, caller):
+    vidx_list = definition_orders(ir)[caller['name']]
     vnode_list = []
     for vidx in vidx_list: 
         node = _vertex_to_node(ir.dag.vs[vidx])
@@ -220,20 +216,19 @@ def _extend_customized_gate(ir, caller, sorted_vidx_list):
 # the current gate into the circuitboard.
 # circuitboard and graph_node_list will be filled during the function
 # @params: [ir] - circuit ir, used to find operations in customized gate definition
-# @params: [sorted_vidx_list] - graph vertex indexes after topological sorting, used to sort customized gate operations
 # @params: [vnode_list] - a list of circuit layer nodes in called order (sort by topology), prepared to be put into the circuitboard
 # @params: [vnode_list] - a list of circuit layer nodes have been put into circuitboard and have their timeSlot been calculated
 # @params: [circuitboard] - a two-dimension array used to simulate the position of gates in a view
 # @params: [view_decompose_level] - desired decompose level of the final view
 # @params: [cur_decompose_level] - current decompose level of nodes in vnode_list
-def _recursive_put_on_board(ir, sorted_vidx_list, vnode_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level=0):
+def _recursive_put_on_board(ir, vnode_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level=0):
     for node in vnode_list:
         if node["type"] == NodeType.op.value or (node["type"] == NodeType.caller.value and cur_decompose_level >= view_decompose_level):
             node["timeSlot"] = _put_on_board(circuitboard, node)
             graph_node_list.append(node)
         elif node["type"] == NodeType.caller.value and cur_decompose_level < view_decompose_level:
-            callee_list = _extend_customized_gate(ir, node, sorted_vidx_list)
-            _recursive_put_on_board(ir, sorted_vidx_list, callee_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level+1)
+            callee_list = _extend_customized_gate(ir, node)
+            _recursive_put_on_board(ir, callee_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level+1)
 
 # convert an ir dag to a list of view layers
 # each layer contains the operations occur at the same time slot
@@ -249,13 +244,13 @@ def dag_to_layers(ir, view_decompose_level):
     vidx_list = ir.dag.topological_sorting() # use g.vs[vidx] to get each vertex
 
     # filter out definitions, only track main thread
-    delete_list = []
+    delete_set = set()
     for vidx in vidx_list:
         vs = ir.dag.vs[vidx]
         if vs.indegree() == 0 and vs['type'] != NodeType.register.value:
             sub_vidx_list = ir.dag.subcomponent(vs)
-            delete_list.extend(sub_vidx_list)
-    main_thread_vidx_list = list(filter(lambda x: x not in delete_list, vidx_list))
+            delete_set.update(sub_vidx_list)
+    main_thread_vidx_list = [x for x in vidx_list if x not in delete_set]
 
     # get total qubit_size, total clbit_size, and view nodes
     qubit_size = 0
@@ -275,7 +270,7 @@ def dag_to_layers(ir, view_decompose_level):
     # fill board according to vs_list
     circuitboard = [[] for i in range(qubit_size)]
     graph_node_list = []
-    _recursive_put_on_board(ir, vidx_list, vnode_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level=0)
+    _recursive_put_on_board(ir, vnode_list, graph_node_list, circuitboard, view_decompose_level, cur_decompose_level=0)
     
     # convert board to layers
     max_slot = max(map(lambda x: len(x), circuitboard))
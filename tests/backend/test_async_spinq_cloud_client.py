@@ -0,0 +1,119 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+from spinqkit.backend.client.async_spinq_cloud_client import AsyncSpinQCloudClient, CREATE_TASK, TASK_STATUS
+
+class StubCloud(object):
+    '''
+    A local stand-in for the login, create and status endpoints. The other endpoints need the token of the
+    last login, and the concurrent requests to each endpoint are counted.
+    '''
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.logins = 0
+        self.token = None
+        self.inflight = {}
+        self.max_inflight = {}
+        self.unauthorized = 0
+        self.app = web.Application()
+        self.app.router.add_post('/user/spinqkit/login', self.login)
+        self.app.router.add_post('/task/user/create', self.create)
+        self.app.router.add_get('/task/user/retrieveCurrentTaskStatus', self.status)
+        self.runner = None
+        self.host = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.host = 'http://127.0.0.1:%d' % self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def login(self, request):
+        self.logins += 1
+        # keep the login slow, so all the rejected requests wait on it
+        await asyncio.sleep(0.05)
+        self.token = 'token%d' % self.logins
+        return web.json_response({'token': self.token})
+
+    async def _handle(self, endpoint: str, request, body: dict):
+        if self.token is None or request.headers.get('token') != self.token:
+            self.unauthorized += 1
+            return web.json_response({'msg': 'token expired'}, status=401)
+        self.inflight[endpoint] = self.inflight.get(endpoint, 0) + 1
+        self.max_inflight[endpoint] = max(self.max_inflight.get(endpoint, 0), self.inflight[endpoint])
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.inflight[endpoint] -= 1
+        return web.json_response(body)
+
+    async def create(self, request):
+        return await self._handle(CREATE_TASK, request, {'task': {'tcode': 'T', 'tstatus': 'PEN', 'createdTime': None}})
+
+    async def status(self, request):
+        return await self._handle(TASK_STATUS, request, {'taskStatus': 'S'})
+
+def run(test):
+    async def main():
+        stub = StubCloud()
+        await stub.start()
+        try:
+            await test(stub)
+        finally:
+            await stub.stop()
+    asyncio.run(main())
+
+def test_concurrent_401s_log_in_once():
+    async def test(stub):
+        async with AsyncSpinQCloudClient('user', 'signature', host=stub.host) as client:
+            responses = await asyncio.gather(*[client.task_status('T%d' % i) for i in range(50)])
+        assert all(r.status_code == 200 for r in responses)
+        assert stub.unauthorized == 50
+        assert stub.logins == 1
+    run(test)
+
+def test_a_new_expiry_logs_in_once_more():
+    async def test(stub):
+        async with AsyncSpinQCloudClient('user', 'signature', host=stub.host) as client:
+            await client.login()
+            stub.token = 'revoked'
+            responses = await asyncio.gather(*[client.task_status('T%d' % i) for i in range(20)])
+        assert all(r.status_code == 200 for r in responses)
+        assert stub.logins == 2
+    run(test)
+
+def test_endpoint_limits_bound_the_inflight_requests():
+    async def test(stub):
+        stub.delay = 0.02
+        limits = {CREATE_TASK: 3, TASK_STATUS: 5}
+        async with AsyncSpinQCloudClient('user', 'signature', host=stub.host, endpoint_limits=limits) as client:
+            await client.login()
+            creates = [client.create_task({'tname': 'task'}) for _ in range(30)]
+            polls = [client.task_status('T%d' % i) for i in range(30)]
+            responses = await asyncio.gather(*creates, *polls)
+        assert all(r.status_code == 200 for r in responses)
+        assert json.loads(responses[0].content)['task']['tcode'] == 'T'
+        assert stub.max_inflight[CREATE_TASK] == 3
+        assert stub.max_inflight[TASK_STATUS] == 5
+    run(test)
@@ -0,0 +1,155 @@
+# Copyright 2021 SpinQ Technology Co., Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from concurrent.futures import CancelledError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from spinqkit.backend import TaskWatcher
+from spinqkit.backend.client.spinq_cloud_client import SpinQCloudClient
+from spinqkit.model.spinqCloud.task import Task
+
+# the timing assertions allow this much scheduling delay
+TOLERANCE = 0.05
+
+class StubCloud(object):
+    '''
+    A local stand-in for the task_status and task_result endpoints. plans maps a task code to the statuses
+    returned by its successive status polls, the last one repeats. The time of every poll is recorded.
+    '''
+    def __init__(self, plans):
+        self.plans = plans
+        self.polls = {code: [] for code in plans}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                code = parse_qs(url.query).get('taskCode', [None])[0]
+                if url.path.endswith('retrieveCurrentTaskStatus'):
+                    with stub.lock:
+                        times = stub.polls[code]
+                        times.append(time.monotonic())
+                        plan = stub.plans[code]
+                        status = plan[min(len(times), len(plan)) - 1]
+                    return self._send(200, {'taskStatus': status})
+                if url.path.endswith('getTaskRunResultByTcode'):
+                    return self._send(200, {'run': {'module': [0.5, 0.0, 0.0, 0.5]}})
+                self._send(404, {'msg': 'not found'})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.host = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tasks(self):
+        client = SpinQCloudClient('user', 'signature', host=self.host)
+        tasks = []
+        for code in self.plans:
+            task = Task('task', 'gemini_vp', None, {0: 0, 1: 1}, api_client=client)
+            task.set_task_code(code)
+            tasks.append(task)
+        return tasks
+
+    def gaps(self, code):
+        times = self.polls[code]
+        return [b - a for a, b in zip(times, times[1:])]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_factory():
+    stubs = []
+    def make(plans):
+        stubs.append(StubCloud(plans))
+        return stubs[-1]
+    yield make
+    for stub in stubs:
+        stub.close()
+
+def test_completions_arrive_in_finishing_order(stub_factory):
+    stub = stub_factory({'A': ['Q', 'Q', 'S'], 'B': ['Q', 'Q', 'Q', 'Q', 'S'], 'C': ['S']})
+    watcher = TaskWatcher(initial_interval=0.02, max_interval=0.02, processing_interval=0.02, jitter=0.0)
+    called = []
+    futures = watcher.watch_all(stub.tasks(), callback=lambda f: called.append(f.task.task_code))
+    try:
+        order = [f.task.task_code for f in watcher.as_completed(futures, timeout=10)]
+    finally:
+        watcher.close()
+    assert order == ['C', 'A', 'B']
+    assert called == ['C', 'A', 'B']
+    assert futures[0].result() == {'00': 0.5, '01': 0.0, '10': 0.0, '11': 0.5}
+    assert len(watcher) == 0
+
+def test_interval_grows_up_to_max_interval(stub_factory):
+    stub = stub_factory({'A': ['Q'] * 7 + ['S']})
+    watcher = TaskWatcher(initial_interval=0.05, max_interval=0.2, processing_interval=0.1, multiplier=2.0, jitter=0.0)
+    try:
+        watcher.watch(stub.tasks()[0]).result(timeout=10)
+    finally:
+        watcher.close()
+    gaps = stub.gaps('A')
+    expected = [0.1, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]
+    assert len(gaps) == len(expected)
+    for gap, e in zip(gaps, expected):
+        assert e - TOLERANCE / 5 <= gap <= e + TOLERANCE
+
+def test_processing_interval_replaces_the_queue_backoff(stub_factory):
+    stub = stub_factory({'A': ['Q'] * 4 + ['PRO'] * 4 + ['S']})
+    watcher = TaskWatcher(initial_interval=0.05, max_interval=0.4, processing_interval=0.1, multiplier=2.0, jitter=0.0)
+    try:
+        watcher.watch(stub.tasks()[0]).result(timeout=10)
+    finally:
+        watcher.close()
+    gaps = stub.gaps('A')
+    # the queued polls back off to max_interval, from the first processing status on they poll every processing_interval
+    assert gaps[2] >= 0.4 - TOLERANCE / 5
+    for gap in gaps[4:]:
+        assert 0.1 - TOLERANCE / 5 <= gap <= 0.1 + TOLERANCE
+
+def test_close_cancels_and_stops_the_polling_thread(stub_factory):
+    stub = stub_factory({'A': ['Q']})
+    watcher = TaskWatcher(initial_interval=0.02, max_interval=30.0, jitter=0.0)
+    future = watcher.watch(stub.tasks()[0])
+    # wait until the watcher sleeps on the long backoff
+    time.sleep(0.2)
+    pollers = [t for t in threading.enumerate() if t.name == 'TaskWatcher']
+    closer = threading.Thread(target=watcher.close)
+    closer.start()
+    closer.join(2.0)
+    assert not closer.is_alive()
+    assert not any(t.is_alive() for t in pollers)
+    with pytest.raises(CancelledError):
+        future.result(timeout=0)
+    with pytest.raises(RuntimeError):
+        watcher.watch(stub.tasks()[0])